@@ -0,0 +1,107 @@
+"""
+Versioned response cache for detail reads.
+
+Every cacheable object (a post, a user) has a version number in the cache.
+Writers don't delete payloads, they bump the version (see the signal receivers
+in posts.signals / users.signals); a cached payload records the versions of
+everything it was built from and is only served while they all still match.
+That way a post payload embedding its author goes stale when the author edits
+their profile, without tracking which payloads mention which user.
+
+Only viewer-independent data is cached; per-viewer fields (has_liked,
+is_following) are resolved by the views on every request.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'detail'
+DEFAULT_TIMEOUT = 300
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _version_key(namespace, pk):
+    return f'{KEY_PREFIX}:v:{namespace}:{pk}'
+
+
+def _initial_version():
+    # Start from the clock rather than 1: if a version key is evicted, the new one
+    # still can't match versions recorded in payloads cached before the eviction.
+    return time.time_ns() // 1000
+
+
+def versions(deps):
+    """Current version of each (namespace, pk) in `deps`, as a list in the same order."""
+    keys = [_version_key(*dep) for dep in deps]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(namespace, *pks):
+    """Invalidate every cached payload built from these objects."""
+    for pk in pks:
+        key = _version_key(namespace, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def _record(namespace, outcome):
+    with _stats_lock:
+        _stats[f'{namespace}.{outcome}'] += 1
+
+
+def stats():
+    """Hit/miss counters of this process, e.g. {'post.hit': 10, 'post.miss': 2}."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_or_build(namespace, pk, build, is_current=None):
+    """
+    Shared payload for an object, from the cache when it is still current.
+
+    `build()` runs on a miss and returns (payload, deps, timeout): deps are the
+    other (namespace, pk) objects the payload depends on, timeout may be None
+    for the default. Exceptions raised by build (e.g. Http404) are not cached.
+
+    `is_current(payload)` can check a cached payload against what the caller
+    just read from the database; payloads it rejects are rebuilt. Versions in
+    a per-process cache only see this process's writes, so views whose ETag
+    comes from the row need it to keep the body in step with the ETag.
+    """
+    key = f'{KEY_PREFIX}:{namespace}:{pk}'
+    entry = cache.get(key)
+    if entry is not None and versions(entry['deps']) == entry['versions'] and (
+        is_current is None or is_current(entry['payload'])
+    ):
+        _record(namespace, 'hit')
+        return entry['payload']
+    _record(namespace, 'miss')
+
+    # Read our own version before building, so a write that lands meanwhile
+    # leaves the entry already stale instead of hiding the change.
+    own_version = versions([(namespace, pk)])
+    payload, deps, timeout = build()
+    deps = [(namespace, pk), *deps]
+    cache.set(key, {
+        'payload': payload,
+        'deps': deps,
+        'versions': own_version + versions(deps[1:]),
+    }, timeout if timeout is not None else getattr(settings, 'DETAIL_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return payload
@@ -0,0 +1,42 @@
+"""
+Conditional GET helpers.
+
+Views compute an ETag from cheap version data (timestamps, counters, the
+page cursor, the viewer's per-post state) *before* serializing, and answer a
+matching If-None-Match with an empty 304 so neither serialization nor the
+body transfer happens. ETags are strong: they change whenever any field of
+the representation could have.
+"""
+import hashlib
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def _matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def _tag(response, etag):
+    response['ETag'] = etag
+    # Representations depend on the viewer (has_liked, is_following)
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
+
+
+def conditional_response(request, etag, build):
+    """304 if the client already has `etag`, otherwise build() the response and tag it."""
+    if _matches(request, etag):
+        return _tag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return _tag(build(), etag)
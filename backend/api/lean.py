@@ -0,0 +1,75 @@
+"""
+Read-only "lean" serializers for hot list endpoints.
+
+A LeanSerializer mirrors a DRF ModelSerializer (same Meta.fields, same
+output) but works on rows from queryset.values(): field accessors are worked
+out once per serializer instead of running DRF's field machinery per row and
+per field. Nested serializers become prefixed lookups ('user__username'), so a
+page of posts with their authors is one query and a list comprehension.
+
+Only plain model fields, nested serializers listed in `nested`, and
+SerializerMethodFields (implemented here as get_<name>(row)) are supported;
+anything else raises ImproperlyConfigured when the serializer is built.
+"""
+from datetime import datetime
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.utils import timezone
+from rest_framework import serializers
+
+
+def format_datetime(value):
+    # Same output as serializers.DateTimeField with the default ISO 8601 format
+    if not value:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def format_values(values):
+    """Row values as serializers render them (datetimes as ISO 8601 strings)."""
+    return tuple(format_datetime(value) if isinstance(value, datetime) else value for value in values)
+
+
+class LeanSerializer:
+    serializer_class = None
+    nested = {}
+
+    def __init__(self, context=None, prefix=''):
+        self.context = context if context is not None else {}
+        self.prefix = prefix
+        self.lookups = []
+        self.accessors = []
+        model = self.serializer_class.Meta.model
+        declared = self.serializer_class._declared_fields
+        for name in self.serializer_class.Meta.fields:
+            field = declared.get(name)
+            if name in self.nested:
+                child = self.nested[name](self.context, prefix=f'{prefix}{name}__')
+                self.lookups += child.lookups
+                self.accessors.append((name, child.to_representation))
+            elif isinstance(field, serializers.SerializerMethodField):
+                self.accessors.append((name, getattr(self, f'get_{name}')))
+            elif field is None:
+                key = prefix + name
+                self.lookups.append(key)
+                if isinstance(model._meta.get_field(name), models.DateTimeField):
+                    self.accessors.append((name, lambda row, key=key: format_datetime(row[key])))
+                else:
+                    self.accessors.append((name, itemgetter(key)))
+            else:
+                raise ImproperlyConfigured(
+                    f'{type(self).__name__} cannot mirror declared field {name!r} of {self.serializer_class.__name__}'
+                )
+
+    def value(self, row, name):
+        return row[self.prefix + name]
+
+    def to_representation(self, row):
+        return {name: get(row) for name, get in self.accessors}
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
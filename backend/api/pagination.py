@@ -0,0 +1,107 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor keyset pagination.
+
+    The cursor encodes the ordering values of the last row on the page, so the
+    next page is a range condition on an index instead of an OFFSET. Every page
+    costs the same no matter how deep the client scrolls. The ordering must end
+    in a unique column (usually '-id') so ties are broken deterministically.
+    The page size is fixed by the server; clients only send the cursor.
+    """
+    page_size = 20
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=('-created_at', '-id')):
+        self.ordering = tuple(ordering)
+        self.page = []
+        self.has_next = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by(*self.ordering)
+        values = self.get_cursor_values(request, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_cursor(), 'results': data})
+
+    def get_cursor_values(self, request, model):
+        """Ordering values of the last row the client saw, or None on the first page."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        return self.decode_cursor(cursor, model) if cursor else None
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        values = [self._value(last, name) for name in self._field_names()]
+        return self.encode_cursor(values)
+
+    def get_keyset_filter(self, values):
+        # (a, b, c) < (x, y, z) expanded so mixed directions work:
+        # a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, values):
+        payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                self._to_python(model, name, value)
+                for name, value in zip(self._field_names(), values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            # Well-formed JSON of the wrong types (e.g. a number for a datetime)
+            raise NotFound(self.invalid_cursor_message)
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    @staticmethod
+    def _value(row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations (e.g. counts) are plain JSON scalars.
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValidationError('Invalid cursor value')
+            return value
+        return field.to_python(value)
@@ -0,0 +1,112 @@
+"""
+Engagement bookkeeping: like/comment counters and trending scores.
+
+New likes and comments go through the model signals (posts.signals). Removals
+from the API, and bulk like/unlike, skip the ORM's per-row signals: post_delete
+fires even when a concurrent request already deleted the row. They write with
+INSERT ... ON CONFLICT and DELETE, and use RETURNING to learn which rows
+actually changed. Counters stay exact even when the same intent is replayed
+or races another request.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import cache as detail_cache
+from . import trending
+from .models import Post, Like, Comment
+
+COUNTERS = {
+    'like': 'likes_count',
+    'comment': 'comments_count',
+}
+
+
+def record_engagement(post_ids, timestamp, kind, removed=False):
+    """Apply one event per post: counter and trending score move together in one atomic UPDATE."""
+    counter = COUNTERS[kind]
+    term = trending.event_term(timestamp, kind)
+    Post.objects.filter(pk__in=post_ids).update(**{
+        counter: F(counter) - 1 if removed else F(counter) + 1,
+        'trending_score': trending.remove_expression(term) if removed else trending.add_expression(term),
+    })
+    detail_cache.bump('post', *post_ids)
+
+
+def _by_timestamp(rows):
+    groups = defaultdict(list)
+    for post_id, created_at in rows:
+        groups[created_at].append(post_id)
+    return groups.items()
+
+
+def _delete_returning(model, where, params):
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {where} RETURNING post_id, created_at', params)
+        return cursor.fetchall()
+
+
+def toggle_like(user, post_id):
+    """Unlike the post if the user likes it, else like it. Returns (liked, likes_count)."""
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with transaction.atomic():
+        removed = _delete_returning(Like, 'user_id = %s AND post_id = %s', [user.pk, post_id])
+        if removed:
+            record_engagement([post_id], removed[0][1], 'like', removed=True)
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, post_id, created_at) VALUES (%s, %s, %s) '
+                    f'ON CONFLICT (user_id, post_id) DO NOTHING RETURNING created_at',
+                    [user.pk, post_id, timezone.now()],
+                )
+                added = cursor.fetchone()
+            # Nothing inserted: a concurrent toggle liked it first, and counted it
+            if added:
+                record_engagement([post_id], added[0], 'like')
+        likes_count = Post.objects.filter(pk=post_id).values_list('likes_count', flat=True).get()
+    return not removed, likes_count
+
+
+def delete_comment(user, comment_id):
+    """Delete the user's comment; False if there was none (or a concurrent request deleted it first)."""
+    with transaction.atomic():
+        removed = _delete_returning(Comment, 'id = %s AND user_id = %s', [comment_id, user.pk])
+        for post_id, created_at in removed:
+            record_engagement([post_id], created_at, 'comment', removed=True)
+    return bool(removed)
+
+
+def apply_like_intents(user, intents):
+    """
+    Make the user's likes match `intents` ({post_id: liked}) for visible posts.
+    Returns {post_id: (liked, likes_count)} for the posts that exist.
+    """
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with transaction.atomic():
+        visible = set(Post.objects.visible().visible_to(user).filter(id__in=intents).values_list('id', flat=True))
+        like = [post_id for post_id, liked in intents.items() if liked and post_id in visible]
+        unlike = [post_id for post_id, liked in intents.items() if not liked and post_id in visible]
+        added, removed = [], []
+        with connection.cursor() as cursor:
+            if like:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, post_id, created_at) SELECT %s, post_id, %s FROM unnest(%s::integer[]) AS post_id '
+                    f'ON CONFLICT (user_id, post_id) DO NOTHING RETURNING post_id, created_at',
+                    [user.pk, timezone.now(), like],
+                )
+                added = cursor.fetchall()
+        if unlike:
+            removed = _delete_returning(Like, 'user_id = %s AND post_id = ANY(%s)', [user.pk, unlike])
+        # New likes share a timestamp, so they are one UPDATE; removals are grouped by when they were liked
+        for timestamp, post_ids in _by_timestamp(added):
+            record_engagement(post_ids, timestamp, 'like')
+        for timestamp, post_ids in _by_timestamp(removed):
+            record_engagement(post_ids, timestamp, 'like', removed=True)
+
+        liked = set(Like.objects.filter(user=user, post_id__in=visible).values_list('post_id', flat=True))
+        counts = dict(Post.objects.filter(id__in=visible).values_list('id', 'likes_count'))
+    return {post_id: (post_id in liked, counts[post_id]) for post_id in visible}
@@ -0,0 +1,33 @@
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Post
+from .signals import posts_expired
+
+
+def sweep_expired_posts(batch_size=1000, now=None):
+    """
+    Deactivate expired temporary posts in chunks of at most `batch_size` rows.
+
+    Each chunk locks its rows with SKIP LOCKED, so several sweepers can run at
+    once without blocking each other. Returns (rows processed, seconds taken).
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    processed = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Post.objects.filter(is_active=True, post_type='temporary', expires_at__lte=now)
+                .order_by('expires_at')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            Post.objects.filter(id__in=ids).update(is_active=False, updated_at=now)
+            posts_expired.send(sender=Post, post_ids=ids)
+        processed += len(ids)
+    return processed, time.monotonic() - started
@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.serializers import LeanPostSerializer
+from posts.timeline import home_timeline
+from users.models import CloseCircleMember, Follow
+
+
+class Command(BaseCommand):
+    help = "Time a feed page with and without audience filtering (PostQuerySet.visible_to) on rolled-back fixture data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        rng = random.Random(0)
+        with transaction.atomic():
+            viewer = User.objects.create_user(email='audience-viewer@example.invalid', username='audience-viewer', password=None)
+            authors = User.objects.bulk_create(
+                User(email=f'audience-{i}@example.invalid', username=f'audience-author-{i}') for i in range(options['authors'])
+            )
+            # The viewer follows every author; a third follow back (friends), a tenth add the viewer to their close circle
+            for i, author in enumerate(authors):
+                Follow.objects.create(follower=viewer, following=author)
+                if i % 3 == 0:
+                    Follow.objects.create(follower=author, following=viewer)
+                if i % 10 == 0:
+                    CloseCircleMember.objects.create(owner=author, member=viewer)
+            Post.objects.bulk_create(
+                Post(user=rng.choice(authors), caption='benchmark', post_type='permanent',
+                     audience=rng.choice([c for c, _ in Post.AUDIENCE_CHOICES]), fanout_skipped=True)
+                for _ in range(options['posts'])
+            )
+
+            lean = LeanPostSerializer()
+            base = Post.objects.visible()
+            feeds = {
+                'feed (today)': lambda: home_timeline(viewer, base),
+                'feed + audience': lambda: home_timeline(viewer, base.visible_to(viewer)),
+            }
+            for name, feed in feeds.items():
+                query = lambda: list(feed().order_by('-created_at', '-id').values(*lean.lookups)[:21])
+                query()  # warm the graph cache and the buffer pool
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    query()
+                ms = (time.perf_counter() - start) * 1000 / options['repeat']
+                self.stdout.write(f"{name:<18}{ms:>8.2f} ms/page")
+            plan = home_timeline(viewer, base.visible_to(viewer)).order_by('-created_at', '-id')[:21].explain()
+            self.stdout.write(plan)
+            transaction.set_rollback(True)
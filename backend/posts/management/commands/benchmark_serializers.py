@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+from posts.models import Post, Comment
+from posts.serializers import PostSerializer, CommentSerializer, LeanPostSerializer, LeanCommentSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare DRF serializers + JSONRenderer with the lean values() path + orjson on post and comment pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[20, 100, 500])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Fixture rows are created in a transaction that is always rolled back
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark@example.invalid', username='benchmark-serializers', password=None
+            )
+            most = max(options['rows'])
+            posts = Post.objects.bulk_create(
+                Post(user=user, caption=f'Benchmark post {i} ✨', media_url=f'https://cdn.example.com/{i}.jpg',
+                     media_type='image', renditions=[{'width': 320, 'height': 320, 'url': 'https://cdn.example.com/r.jpg'}])
+                for i in range(most)
+            )
+            Comment.objects.bulk_create(Comment(user=user, post=posts[0], text=f'comment {i}') for i in range(most))
+
+            self.stdout.write(f"{'endpoint':<10}{'rows':>6}{'drf ms':>10}{'lean ms':>10}{'speedup':>9}")
+            for rows in options['rows']:
+                for name, drf, lean in (
+                    ('posts', self._drf_posts(rows), self._lean_posts(rows)),
+                    ('comments', self._drf_comments(posts[0], rows), self._lean_comments(posts[0], rows)),
+                ):
+                    if drf() != lean():
+                        raise AssertionError(f'{name}: lean output differs from DRF at {rows} rows')
+                    drf_ms, lean_ms = self._time(drf, options['repeat']), self._time(lean, options['repeat'])
+                    self.stdout.write(f"{name:<10}{rows:>6}{drf_ms:>10.2f}{lean_ms:>10.2f}{drf_ms / lean_ms:>8.1f}x")
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _time(render, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            render()
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    @staticmethod
+    def _drf_posts(rows):
+        def render():
+            posts = Post.objects.select_related('user').order_by('-created_at', '-id')[:rows]
+            return JSONRenderer().render(PostSerializer(posts, many=True, context={'liked_post_ids': set()}).data)
+        return render
+
+    @staticmethod
+    def _lean_posts(rows):
+        def render():
+            lean = LeanPostSerializer({'liked_post_ids': set()})
+            posts = Post.objects.order_by('-created_at', '-id').values(*lean.lookups)[:rows]
+            return ORJSONRenderer().render(lean.many(posts))
+        return render
+
+    @staticmethod
+    def _drf_comments(post, rows):
+        def render():
+            comments = Comment.objects.filter(post=post).select_related('user').order_by('-created_at', '-id')[:rows]
+            return JSONRenderer().render(CommentSerializer(comments, many=True).data)
+        return render
+
+    @staticmethod
+    def _lean_comments(post, rows):
+        def render():
+            lean = LeanCommentSerializer()
+            comments = Comment.objects.filter(post=post).order_by('-created_at', '-id').values(*lean.lookups)[:rows]
+            return ORJSONRenderer().render(lean.many(comments))
+        return render
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.expiry import sweep_expired_posts
+
+
+class Command(BaseCommand):
+    help = "Deactivate expired temporary posts (Blinks). Run from cron, or with --loop as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per UPDATE")
+        parser.add_argument('--loop', action='store_true', help="Keep running, sweeping every --interval seconds")
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        while True:
+            processed, elapsed = sweep_expired_posts(batch_size=options['batch_size'])
+            self.stdout.write(f"Expired {processed} posts in {elapsed:.3f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import UploadSession
+from posts.uploads import get_chunk_store
+
+
+class Command(BaseCommand):
+    help = "Delete upload sessions (and their staged chunks) untouched for longer than UPLOAD_SESSION_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - settings.UPLOAD_SESSION_TTL
+        store = get_chunk_store()
+        purged = 0
+        while True:
+            ids = list(UploadSession.objects.filter(updated_at__lt=cutoff).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            for session_id in ids:
+                store.delete(session_id)
+            UploadSession.objects.filter(id__in=ids).delete()
+            purged += len(ids)
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} upload sessions"))
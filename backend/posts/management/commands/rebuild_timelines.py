@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Follow
+from posts.timeline import get_timeline_backend
+
+
+class Command(BaseCommand):
+    help = "Backfill home timelines from existing follows (run once after enabling fan-out, or to repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_timeline_backend()
+        follows = Follow.objects.order_by('id').values_list('follower_id', 'following_id')
+        count = 0
+        for follower_id, following_id in follows.iterator(chunk_size=options['batch_size']):
+            backend.backfill(follower_id, following_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Backfilled timelines for {count} follows"))
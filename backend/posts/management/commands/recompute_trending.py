@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import trending
+from posts.models import Post, Like, Comment
+
+
+class Command(BaseCommand):
+    help = "Recompute trending scores from likes and comments (repairs drift; run periodically and after migrating)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, updated = 0, 0
+        while True:
+            # Engagement adds to trending_score on the post row in its own transaction: with the batch
+            # locked, each event is either in the recomputed score or applied on top of it
+            with transaction.atomic():
+                posts = list(Post.objects.select_for_update().filter(is_active=True, id__gt=last_id).order_by('id')
+                             .only('id', 'created_at')[:batch_size])
+                if not posts:
+                    break
+                ids = [p.id for p in posts]
+                like_times, comment_times = defaultdict(list), defaultdict(list)
+                for post_id, created_at in Like.objects.filter(post_id__in=ids).values_list('post_id', 'created_at'):
+                    like_times[post_id].append(created_at)
+                for post_id, created_at in Comment.objects.filter(post_id__in=ids).values_list('post_id', 'created_at'):
+                    comment_times[post_id].append(created_at)
+                for post in posts:
+                    post.trending_score = trending.compute_score(post.created_at, like_times[post.id], comment_times[post.id])
+                Post.objects.bulk_update(posts, ['trending_score'])
+            updated += len(posts)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Recomputed trending scores for {updated} posts"))
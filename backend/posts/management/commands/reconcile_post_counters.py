@@ -0,0 +1,42 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api import cache as detail_cache
+from posts.models import Post, Like, Comment
+
+
+class Command(BaseCommand):
+    help = "Repair drift in Post.likes_count / comments_count, one id range at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, checked, repaired = 0, 0, 0
+        while True:
+            # Likes and comments bump the counter on the post row in their own transaction, so with the
+            # batch locked, every one is either in the counts below or lands on top of the repaired value
+            with transaction.atomic():
+                posts = list(Post.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                             .only('id', 'likes_count', 'comments_count')[:batch_size])
+                if not posts:
+                    break
+                ids = [p.id for p in posts]
+                likes = Counter(dict(Like.objects.filter(post_id__in=ids).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n')))
+                comments = Counter(dict(Comment.objects.filter(post_id__in=ids).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n')))
+                drifted = []
+                for post in posts:
+                    if (post.likes_count, post.comments_count) != (likes[post.id], comments[post.id]):
+                        post.likes_count, post.comments_count = likes[post.id], comments[post.id]
+                        drifted.append(post)
+                # Only drifted rows are written; counters are re-applied as absolute values
+                Post.objects.bulk_update(drifted, ['likes_count', 'comments_count'])
+            detail_cache.bump('post', *(p.id for p in drifted))
+            checked += len(posts)
+            repaired += len(drifted)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, repaired {repaired}"))
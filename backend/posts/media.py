@@ -0,0 +1,126 @@
+"""
+Media uploads.
+
+Uploaded files are streamed to storage in fixed-size chunks (Django spools
+large uploads to a temp file, so the worker never holds the whole file in
+memory). Clients can also skip the API entirely: ask for a pre-signed upload
+URL, PUT the file straight to storage, then create the post with the key.
+
+Files that pass through the API are content-addressed: identical bytes are
+stored once (see acquire_media / release_media). The storage itself is
+pluggable, see qwik_backend.storage.
+"""
+import hashlib
+import re
+import uuid
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from qwik_backend.storage import (
+    StorageError as MediaUploadError, StorageUnavailable as MediaUnavailable, get_storage, iter_chunks,
+)
+from .models import MediaObject
+
+DIRECT_UPLOAD_PREFIX = 'uploads'
+CONTENT_PREFIX = 'media'
+EXTENSION_RE = re.compile(r'[a-z0-9]{1,8}')
+
+
+def _extension(filename):
+    # Client-supplied, and it ends up in the storage key: a few ASCII alphanumerics or 'bin'
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return ext if EXTENSION_RE.fullmatch(ext) else 'bin'
+
+
+def public_url(key):
+    return get_storage().public_url(key)
+
+
+def upload_media(file, content_type=None, key=None):
+    """Stream a file (an UploadedFile or an open staged file) to storage chunk by chunk; returns its public URL."""
+    key = key or f"{uuid.uuid4()}.{_extension(file.name)}"
+    content_type = content_type or getattr(file, 'content_type', None) or 'application/octet-stream'
+    return get_storage().upload(key, file, content_type)
+
+
+def delete_media(keys):
+    """Remove objects from storage."""
+    get_storage().delete(keys)
+
+
+def file_sha256(file):
+    """Digest computed by the hashing upload handlers, or by reading the file if it came from elsewhere."""
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        for chunk in iter_chunks(file):
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+    return digest
+
+
+def acquire_media(file, content_type=None):
+    """
+    Return the MediaObject for these bytes with one more reference, uploading
+    them only if no identical file is stored yet. Call outside a transaction:
+    the upload can take a while, and the reference commits straight away. If
+    the post that was to hold it then fails to save, hand it back with
+    release_media.
+    """
+    digest = file_sha256(file)
+    if MediaObject.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1):
+        return MediaObject.objects.get(sha256=digest)
+    content_type = content_type or getattr(file, 'content_type', None) or ''
+    key = f"{CONTENT_PREFIX}/{digest}.{_extension(file.name)}"
+    url = upload_media(file, content_type=content_type, key=key)
+    try:
+        with transaction.atomic():
+            return MediaObject.objects.create(
+                sha256=digest, storage_key=key, url=url, size=file.size,
+                content_type=content_type, ref_count=1,
+            )
+    except IntegrityError:
+        # Someone stored the same bytes while we were uploading
+        MediaObject.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+        return MediaObject.objects.get(sha256=digest)
+
+
+def release_media(media_ids):
+    """
+    Drop one reference per id (ids may repeat). Objects nobody points at any
+    more are deleted, files and rows, once this transaction commits.
+    """
+    for media_id, count in Counter(media_ids).items():
+        MediaObject.objects.filter(pk=media_id).update(ref_count=F('ref_count') - count)
+    orphan_ids = list(MediaObject.objects.filter(pk__in=set(media_ids), ref_count=0).values_list('pk', flat=True))
+    if orphan_ids:
+        transaction.on_commit(lambda: delete_orphans(orphan_ids), robust=True)
+
+
+def delete_orphans(media_ids):
+    """
+    Delete the objects among `media_ids` that still have no references. The
+    rows stay locked until their files are gone: an acquire_media of the same
+    bytes meanwhile either took its reference first (and the object is kept)
+    or waits, finds no row, and uploads the file again.
+    """
+    with transaction.atomic():
+        orphans = MediaObject.objects.select_for_update().filter(pk__in=media_ids, ref_count=0)
+        rows = list(orphans.values_list('pk', 'storage_key'))
+        if rows:
+            delete_media([key for _, key in rows])
+            MediaObject.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+
+
+def create_direct_upload(user, filename):
+    """Reserve a key under the user's prefix and return a pre-signed URL to PUT the file to."""
+    key = f"{DIRECT_UPLOAD_PREFIX}/{user.id}/{uuid.uuid4()}.{_extension(filename)}"
+    return {'key': key, **get_storage().create_signed_upload(key)}
+
+
+def is_direct_upload_key(user, key):
+    """Keys handed out by create_direct_upload for this user (and nothing else)."""
+    prefix = f"{DIRECT_UPLOAD_PREFIX}/{user.id}/"
+    return key.startswith(prefix) and '/' not in key[len(prefix):] and '..' not in key
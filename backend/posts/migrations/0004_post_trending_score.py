@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:09
+
+import posts.trending
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=posts.trending.initial_score, help_text='Log-space time-decayed engagement (see posts.trending)'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_post_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("post_type", "temporary")),
+                fields=["expires_at"],
+                name="post_expiry_sweep_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0009_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="placeholder",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="BlurHash shown while media loads",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="poster_url",
+            field=models.URLField(
+                blank=True, help_text="Video poster frame", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="processing_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="renditions",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Downscaled copies: [{width, height, url}], smallest first",
+            ),
+        ),
+    ]
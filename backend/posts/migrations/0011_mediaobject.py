@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_post_media_processing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaObject",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("storage_key", models.CharField(max_length=255)),
+                ("url", models.URLField()),
+                ("size", models.PositiveBigIntegerField()),
+                ("content_type", models.CharField(blank=True, max_length=100)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="media",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="posts",
+                to="posts.mediaobject",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0012_comment_post_recent_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="audience",
+            field=models.CharField(
+                choices=[
+                    ("public", "Public"),
+                    ("friends", "Friends"),
+                    ("close_circle", "Close circle"),
+                ],
+                default="public",
+                max_length=12,
+            ),
+        ),
+    ]
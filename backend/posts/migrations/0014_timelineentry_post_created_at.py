@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_post_audience"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timelineentry",
+            name="post_created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE posts_timelineentry AS entry SET post_created_at = post.created_at "
+            "FROM posts_post AS post WHERE post.id = entry.post_id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="timelineentry",
+            name="post_created_at",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["owner", "-post_created_at", "-post"],
+                name="timeline_owner_recent_idx",
+            ),
+        ),
+    ]
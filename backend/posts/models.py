@@ -1,6 +1,47 @@
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from django.utils import timezone
-from users.models import User  # Assuming User is in users app
+from qwik_backend.storage import is_stored_url
+from users.models import Audience, User  # Assuming User is in users app
+from . import trending
+
+class MediaObject(models.Model):
+    """
+    A stored media file, addressed by the SHA-256 of its bytes. Posts that upload
+    identical media share one object; `ref_count` tracks how many live posts point
+    at it, and the file is removed from storage when it drops to zero.
+    """
+    id = models.AutoField(primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    storage_key = models.CharField(max_length=255)
+    url = models.URLField()
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Media {self.sha256[:12]} ({self.ref_count} refs)"
+
+class PostQuerySet(models.QuerySet):
+    def visible(self):
+        """Active posts that have not expired, even if the expiry sweeper hasn't run yet."""
+        return self.filter(is_active=True).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+        )
+
+    def visible_to(self, user):
+        """Posts whose audience includes `user`: public, their own, or via the precomputed Audience rows."""
+        audience = Audience.objects.filter(viewer_id=user.pk)
+        return self.filter(
+            models.Q(audience=Post.AUDIENCE_PUBLIC)
+            | models.Q(user_id=user.pk)
+            | models.Q(audience=Post.AUDIENCE_FRIENDS, user_id__in=audience.filter(is_friend=True).values('owner_id'))
+            | models.Q(audience=Post.AUDIENCE_CLOSE_CIRCLE, user_id__in=audience.filter(is_close=True).values('owner_id'))
+        )
 
 class Post(models.Model):
     MEDIA_TYPE_CHOICES = [
@@ -12,27 +53,76 @@ class Post(models.Model):
         ('temporary', 'Temporary'),
         ('permanent', 'Permanent'),
     ]
+    AUDIENCE_PUBLIC = 'public'
+    AUDIENCE_FRIENDS = 'friends'
+    AUDIENCE_CLOSE_CIRCLE = 'close_circle'
+    AUDIENCE_CHOICES = [
+        (AUDIENCE_PUBLIC, 'Public'),
+        (AUDIENCE_FRIENDS, 'Friends'),
+        (AUDIENCE_CLOSE_CIRCLE, 'Close circle'),
+    ]
     
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     caption = models.TextField(blank=True, null=True)
     media_url = models.URLField(blank=True, null=True)  # Firebase URL
+    media = models.ForeignKey(MediaObject, on_delete=models.PROTECT, null=True, blank=True, related_name='posts')
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, default='text')
     post_type = models.CharField(max_length=10, choices=POST_TYPE_CHOICES, default='temporary')
+    audience = models.CharField(max_length=12, choices=AUDIENCE_CHOICES, default=AUDIENCE_PUBLIC)
     is_active = models.BooleanField(default=True)
     expires_at = models.DateTimeField(blank=True, null=True)
     converted_at = models.DateTimeField(blank=True, null=True)
+    PROCESSING_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_STATUS_CHOICES, blank=True, default='')
+    renditions = models.JSONField(default=list, blank=True, help_text="Downscaled copies: [{width, height, url}], smallest first")
+    placeholder = models.CharField(max_length=64, blank=True, default='', help_text="BlurHash shown while media loads")
+    poster_url = models.URLField(blank=True, null=True, help_text="Video poster frame")
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=trending.initial_score, help_text="Log-space time-decayed engagement (see posts.trending)")
+    search_vector = models.GeneratedField(
+        expression=SearchVector('caption', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    fanout_skipped = models.BooleanField(default=False, help_text="Author had too many followers; merged into feeds at read time")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Hot reads: recent visible posts, and one user's recent posts
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True), name='post_active_recent_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_recent_idx'),
+            models.Index(fields=['user', 'created_at'], condition=models.Q(fanout_skipped=True), name='post_fanout_skipped_idx'),
+            models.Index(fields=['-trending_score', '-id'], condition=models.Q(is_active=True), name='post_trending_idx'),
+            GinIndex(fields=['search_vector'], name='post_search_vector_idx'),
+            models.Index(fields=['expires_at'], condition=models.Q(is_active=True, post_type='temporary'), name='post_expiry_sweep_idx'),
+        ]
+
     def save(self, *args, **kwargs):
+        now = timezone.now()
         if self.post_type == 'temporary' and not self.expires_at:
-            self.expires_at = timezone.now() + timezone.timedelta(hours=24)
-        super().save(*args, **kwargs)
-        # Auto-deactivate if expired (call this in a Celery task for production, but simple check here)
-        if self.expires_at and self.expires_at < timezone.now() and self.is_active:
+            self.expires_at = now + timezone.timedelta(hours=24)
+        if self._state.adding and self.media_type in ('image', 'video') and (
+            self.media_id or is_stored_url(self.media_url)
+        ):
+            # Picked up by posts.tasks.process_post_media. Only media in our own storage:
+            # a worker must never fetch an arbitrary client-supplied URL.
+            self.processing_status = 'pending'
+        # Deactivate in the same write if already expired; untouched posts are handled by the expire_posts sweeper
+        if self.is_active and self.expires_at and self.expires_at <= now:
             self.is_active = False
-            super().save(update_fields=['is_active'])
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'is_active'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Post {self.id} by {self.user.username}"
@@ -57,5 +147,57 @@ class Comment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A post's comments newest first: keyset pages and feed previews are index range scans
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Comment {self.id} by {self.user.username} on Post {self.post.id}"
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline: one row per (follower, post), written when the post is created.
+    The post's created_at is copied in so a feed page is one range scan of the owner's rows.
+    """
+    id = models.BigAutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    post_created_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-post_created_at', '-post'], name='timeline_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.owner_id}'s timeline"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable (chunked) media upload. Bytes are staged by posts.uploads until
+    `offset == size`, then finalized into a Post.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField(help_text="Total bytes expected")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far")
+    post = models.OneToOneField(Post, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'])]
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
     def __str__(self):
-        return f"Comment {self.id} by {self.user.username} on Post {self.post.id}"
\ No newline at end of file
+        return f"Upload {self.id} by {self.user_id} ({self.offset}/{self.size})"
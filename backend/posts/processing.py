@@ -0,0 +1,165 @@
+"""
+Media processing: image renditions, blurhash placeholders and video posters.
+
+Runs in Celery workers (see posts.tasks), never on the request path. The
+functions here take and return bytes so they can be tested without storage.
+"""
+import io
+import math
+import shutil
+import subprocess
+import tempfile
+
+import httpx
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from qwik_backend.storage import is_stored_url
+from .media import upload_media
+
+JPEG_QUALITY = 82
+PLACEHOLDER_SIZE = 32
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _open_image(data):
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)  # respect camera orientation before resizing
+    return image.convert('RGB')
+
+
+def image_renditions(data, widths=None):
+    """
+    Downscaled JPEG copies of an image: one per configured width smaller than
+    the original. Returns [(width, height, jpeg_bytes)], smallest first.
+    """
+    widths = widths or settings.MEDIA_RENDITION_WIDTHS
+    image = _open_image(data)
+    renditions = []
+    for width in sorted(widths):
+        if width >= image.width:
+            break
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        resized.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        renditions.append((width, height, out.getvalue()))
+    return renditions
+
+
+def _encode83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exp):
+    return math.copysign(abs(value) ** exp, value)
+
+
+def blurhash(data, x_components=4, y_components=3):
+    """BlurHash (https://blurha.sh) of an image, computed on a small thumbnail."""
+    image = _open_image(data)
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    width, height = image.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in image.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = normalisation * math.cos(math.pi * i * x / width) * cos_y
+                    pr, pg, pb = linear[y * width + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = 1 / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, int(max(abs(c) for f in ac for c in f) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += _encode83(0, 1)
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(_sign_pow(c / maximum, 0.5) * 9 + 9.5))) for c in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def video_poster(path, at_seconds=1.0):
+    """First frame after `at_seconds` as JPEG bytes, or None when ffmpeg is unavailable."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    result = subprocess.run(
+        [ffmpeg, '-v', 'error', '-ss', str(at_seconds), '-i', str(path),
+         '-frames:v', '1', '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
+        capture_output=True, timeout=60,
+    )
+    return result.stdout or None
+
+
+def _download(url, target):
+    # Only from our own storage, no redirects and at most MEDIA_PROCESSING_MAX_BYTES
+    if not is_stored_url(url):
+        raise ValueError(f"Not a stored media URL: {url}")
+    limit = settings.MEDIA_PROCESSING_MAX_BYTES
+    with httpx.stream('GET', url, timeout=httpx.Timeout(10.0, read=60.0)) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > limit:
+            raise ValueError(f"Media larger than {limit} bytes")
+        received = 0
+        for chunk in response.iter_bytes():
+            received += len(chunk)
+            if received > limit:
+                raise ValueError(f"Media larger than {limit} bytes")
+            target.write(chunk)
+    target.flush()
+    target.seek(0)
+
+
+def process_post(post):
+    """Generate and upload derived media for a post; returns the fields to save."""
+    fields = {}
+    with tempfile.NamedTemporaryFile() as original:
+        _download(post.media_url, original)
+        if post.media_type == 'image':
+            data = original.read()
+            fields['placeholder'] = blurhash(data)
+            fields['renditions'] = [
+                {
+                    'width': width,
+                    'height': height,
+                    'url': upload_media(ContentFile(jpeg, name=f'{width}.jpg'), content_type='image/jpeg',
+                                        key=f'renditions/{post.pk}/{width}.jpg'),
+                }
+                for width, height, jpeg in image_renditions(data)
+            ]
+        elif post.media_type == 'video':
+            poster = video_poster(original.name)
+            if poster:
+                fields['poster_url'] = upload_media(ContentFile(poster, name='poster.jpg'), content_type='image/jpeg',
+                                                    key=f'renditions/{post.pk}/poster.jpg')
+                fields['placeholder'] = blurhash(poster)
+    return fields
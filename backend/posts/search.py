@@ -0,0 +1,24 @@
+"""
+Caption search.
+
+Full-text matches use the generated `search_vector` column (GIN indexed) and
+are ranked with ts_rank. Substring matches (partial words, hashtags fragments)
+fall back to `icontains`, which PostgreSQL serves from the trigram index on
+UPPER(caption) when pg_trgm is installed; those rank below full-text hits.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+
+
+def search_posts(queryset, term):
+    """Filter `queryset` to posts matching `term`, annotated with a `rank` to order by."""
+    query = SearchQuery(term, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=query) | Q(caption__icontains=term)
+    ).annotate(
+        # ts_rank returns real; as double it survives the cursor round trip exactly
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+    )
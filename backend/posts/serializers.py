@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
-from .models import Post, Like, Comment
-from users.serializers import UserSerializer  # Assuming you have one in users/serializers.py
+from .models import Post, Like, Comment, UploadSession
+from api.lean import LeanSerializer
+from users.serializers import LeanUserSerializer, UserSerializer  # Assuming you have one in users/serializers.py
 
 class CommentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -10,6 +13,14 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'post', 'text', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            # Only posts the requester can see: a hidden post is rejected like a missing one
+            fields['post'].queryset = Post.objects.visible().visible_to(request.user)
+        return fields
+
 class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -18,28 +29,44 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'post', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Resolves per-viewer fields for a whole page at once so that
+    serializing N posts does not cost N extra queries (unless the view
+    already passed liked_post_ids in the context).
+    """
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get('request')
+        if 'liked_post_ids' not in self.context and request and request.user.is_authenticated:
+            self.context['liked_post_ids'] = set(
+                Like.objects.filter(user=request.user, post_id__in=[p.pk for p in posts])
+                .values_list('post_id', flat=True)
+            )
+        return super().to_representation(posts)
+
 class PostSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
-            'id', 'user', 'caption', 'media_url', 'media_type', 'post_type',
+            'id', 'user', 'caption', 'media_url', 'media_type', 'post_type', 'audience',
             'is_active', 'expires_at', 'converted_at', 'created_at', 'updated_at',
-            'likes_count', 'comments_count', 'has_liked'
+            'likes_count', 'comments_count', 'has_liked',
+            'processing_status', 'renditions', 'placeholder', 'poster_url'
         ]
-        read_only_fields = ['id', 'user', 'is_active', 'created_at', 'updated_at', 'likes_count', 'comments_count', 'has_liked']
-
-    def get_likes_count(self, obj):
-        return obj.likes_received.count()
-
-    def get_comments_count(self, obj):
-        return obj.comments_received.count()
+        read_only_fields = [
+            'id', 'user', 'is_active', 'created_at', 'updated_at', 'likes_count', 'comments_count', 'has_liked',
+            'processing_status', 'renditions', 'placeholder', 'poster_url'
+        ]
+        list_serializer_class = PostListSerializer
 
     def get_has_liked(self, obj):
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.pk in liked_post_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes_received.filter(user=request.user).exists()
@@ -47,4 +74,42 @@ class PostSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class LikeIntentSerializer(serializers.Serializer):
+    """One queued like/unlike for the bulk endpoint: the final state the client wants."""
+    post = serializers.IntegerField(min_value=1)
+    liked = serializers.BooleanField()
+
+class LeanPostSerializer(LeanSerializer):
+    """
+    PostSerializer output from values() rows. Pass the viewer's liked ids as
+    context['liked_post_ids'].
+    """
+    serializer_class = PostSerializer
+    nested = {'user': LeanUserSerializer}
+
+    def get_has_liked(self, row):
+        return self.value(row, 'id') in self.context.get('liked_post_ids', ())
+
+class LeanCommentSerializer(LeanSerializer):
+    """CommentSerializer output from values() rows."""
+    serializer_class = CommentSerializer
+    nested = {'user': LeanUserSerializer}
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'content_type', 'size', 'offset', 'post', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'offset', 'post', 'created_at', 'updated_at']
+
+    def validate_content_type(self, value):
+        if not value.startswith('video/'):
+            raise serializers.ValidationError("Resumable uploads are for video files.")
+        return value
+
+    def validate_size(self, value):
+        max_size = getattr(settings, 'UPLOAD_SESSION_MAX_SIZE', 500 * 1024 * 1024)
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(f"Size must be between 1 and {max_size} bytes.")
+        return value
@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from api import cache as detail_cache
+from users.models import Follow
+from users.signals import follows_created
+from .engagement import record_engagement
+from .media import release_media
+from .models import Post, Like, Comment
+from .tasks import backfill_home_timeline, fan_out_to_followers, process_post_media
+from .timeline import get_timeline_backend
+
+# Sent by the expiry sweeper after a chunk of posts is deactivated with a bulk UPDATE
+# (which bypasses post_save). Args: post_ids.
+posts_expired = Signal()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    detail_cache.bump('post', instance.pk)
+
+
+@receiver(posts_expired)
+def invalidate_expired_posts(sender, post_ids, **kwargs):
+    detail_cache.bump('post', *post_ids)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active:
+            # Up to TIMELINE_FANOUT_LIMIT inserts: off the request path, after commit like media processing
+            transaction.on_commit(lambda: fan_out_to_followers.delay(instance.pk), robust=True)
+    elif not instance.is_active:
+        get_timeline_backend().remove([instance.pk])
+
+
+def _release_post_media(post_ids):
+    # Expired posts give up their media reference; clearing the FK keeps a later delete from releasing twice
+    media_ids = list(Post.objects.filter(id__in=post_ids, media__isnull=False).values_list('media_id', flat=True))
+    if media_ids:
+        Post.objects.filter(id__in=post_ids).update(media=None)
+        release_media(media_ids)
+
+
+@receiver(post_save, sender=Post)
+def release_deactivated_media(sender, instance, created, **kwargs):
+    if not created and not instance.is_active and instance.media_id:
+        _release_post_media([instance.pk])
+        instance.media = None
+
+
+@receiver(post_save, sender=Post)
+def queue_media_processing(sender, instance, created, **kwargs):
+    if created and instance.processing_status == 'pending':
+        # Only once the post is committed, so the worker can see it. robust: a broker
+        # outage leaves the post 'pending' instead of failing the request.
+        transaction.on_commit(lambda: process_post_media.delay(instance.pk), robust=True)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_timelines(sender, instance, **kwargs):
+    get_timeline_backend().remove([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_media(sender, instance, **kwargs):
+    if instance.media_id:
+        release_media([instance.media_id])
+
+
+@receiver(posts_expired)
+def remove_expired_from_timelines(sender, post_ids, **kwargs):
+    get_timeline_backend().remove(post_ids)
+
+
+@receiver(posts_expired)
+def release_expired_media(sender, post_ids, **kwargs):
+    _release_post_media(post_ids)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        get_timeline_backend().backfill(instance.follower_id, instance.following_id)
+
+
+@receiver(follows_created)
+def backfill_timeline_bulk(sender, follower_id, following_ids, **kwargs):
+    # Up to a few hundred authors at once: off the request path, after commit like media processing
+    transaction.on_commit(lambda: backfill_home_timeline.delay(follower_id, list(following_ids)), robust=True)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    get_timeline_backend().trim(instance.follower_id, instance.following_id)
+
+
+def _deleted_with_post(origin):
+    # Cascades from deleting the post itself don't need to touch its counters
+    return isinstance(origin, Post) or getattr(origin, 'model', None) is Post
+
+
+@receiver(post_save, sender=Like)
+def like_added(sender, instance, created, **kwargs):
+    if created:
+        record_engagement([instance.post_id], instance.created_at, 'like')
+
+
+@receiver(post_delete, sender=Like)
+def like_removed(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_post(origin):
+        record_engagement([instance.post_id], instance.created_at, 'like', removed=True)
+
+
+@receiver(post_save, sender=Comment)
+def comment_added(sender, instance, created, **kwargs):
+    if created:
+        record_engagement([instance.post_id], instance.created_at, 'comment')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_removed(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_post(origin):
+        record_engagement([instance.post_id], instance.created_at, 'comment', removed=True)
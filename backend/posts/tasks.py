@@ -0,0 +1,47 @@
+import logging
+
+import httpx
+from celery import shared_task
+
+from api import cache as detail_cache
+from .media import MediaUploadError
+from .models import Post
+from .processing import process_post
+from .timeline import fan_out, get_timeline_backend
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(autoretry_for=(httpx.HTTPError, MediaUploadError), retry_backoff=True, max_retries=5)
+def process_post_media(post_id):
+    post = Post.objects.filter(pk=post_id).exclude(media_url__isnull=True).exclude(media_url='').first()
+    if post is None:
+        return
+    try:
+        fields = process_post(post)
+    except (httpx.HTTPError, MediaUploadError):
+        raise  # transient: retried with backoff
+    except Exception:
+        logger.exception("Media processing failed for post %s", post_id)
+        Post.objects.filter(pk=post_id).update(processing_status='failed')
+        detail_cache.bump('post', post_id)
+        return
+    # update() rather than save(): don't bump updated_at or fire post_save for derived data
+    Post.objects.filter(pk=post_id).update(processing_status='ready', **fields)
+    detail_cache.bump('post', post_id)
+
+
+@shared_task
+def fan_out_to_followers(post_id):
+    """Push a new post into its followers' timelines (up to TIMELINE_FANOUT_LIMIT rows)."""
+    post = Post.objects.select_related('user').filter(pk=post_id, is_active=True).first()
+    if post is not None:
+        fan_out(post)
+
+
+@shared_task
+def backfill_home_timeline(owner_id, author_ids):
+    """Recent posts of newly followed authors into a home timeline (bulk follows skip the per-row signal)."""
+    backend = get_timeline_backend()
+    for author_id in author_ids:
+        backend.backfill(owner_id, author_id)
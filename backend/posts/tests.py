@@ -1,3 +1,956 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+import httpx
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework import status
+from api import cache as detail_cache
+from api.pagination import KeysetPagination
+from api.renderers import ORJSONRenderer
+from qwik_backend.storage import CHUNK_SIZE, LocalStorage, StorageError, SupabaseStorage
+from users.models import Audience, CloseCircleMember, Follow
+from . import media, processing, trending
+from .models import Post, Like, Comment, MediaObject, TimelineEntry, UploadSession
+from .serializers import PostSerializer, CommentSerializer, LeanPostSerializer, LeanCommentSerializer
+from .tasks import backfill_home_timeline, fan_out_to_followers, process_post_media
+from .uploads import get_chunk_store
 
-# Create your tests here.
+User = get_user_model()
+
+@contextmanager
+def fan_out_inline(test):
+    # Fan-out is queued after commit, which a test transaction never reaches
+    with mock.patch('posts.signals.fan_out_to_followers.delay', side_effect=fan_out_to_followers):
+        with test.captureOnCommitCallbacks(execute=True):
+            yield
+
+class PostPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def _collect(self, url, **params):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(url, {**params, 'cursor': cursor} if cursor else params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(p['id'] for p in response.data['results'])
+            cursor = response.data['next']
+            if cursor is None:
+                return ids
+
+    def test_feed_pages_are_complete_and_ordered(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        with fan_out_inline(self):
+            posts = [Post.objects.create(user=self.other, caption=f'post {i}') for i in range(45)]
+        response = self.client.get('/api/posts/posts/?feed')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(self._collect('/api/posts/posts/', feed=''), [p.id for p in reversed(posts)])
+
+    def test_page_size_is_server_controlled(self):
+        for i in range(30):
+            Post.objects.create(user=self.user, caption=f'post {i}')
+        response = self.client.get('/api/posts/posts/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_trending_cursor_is_stable(self):
+        posts = [Post.objects.create(user=self.user, caption=f'post {i}') for i in range(25)]
+        for post in posts[:3]:
+            Like.objects.create(user=self.other, post=post)
+        ids = self._collect('/api/posts/posts/', trending='')
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(ids[:3], [p.id for p in reversed(posts[:3])])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/posts/posts/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # Valid encoding, wrong types: a number where the datetime goes
+        mistyped = KeysetPagination().encode_cursor([5, 1])
+        response = self.client.get('/api/posts/posts/', {'cursor': mistyped})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class PostFeedQueryCountTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        Follow.objects.create(follower=self.user, following=self.other)
+        self.client.force_authenticate(user=self.user)
+
+    def _create_posts(self, count):
+        for i in range(count):
+            with fan_out_inline(self):
+                post = Post.objects.create(user=self.other, caption=f'post {i}')
+            if i % 2:
+                Like.objects.create(user=self.user, post=post)
+            Comment.objects.create(user=self.other, post=post, text='hi')
+
+    def test_feed_query_count_is_constant(self):
+        self._create_posts(5)
+        self.client.get('/api/posts/posts/?feed')  # loads the viewer's following set into the graph cache
+        # timeline, own and high-follower ranges, posts page, liked ids
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/posts/posts/?feed')
+        self.assertEqual(len(response.data['results']), 5)
+        self._create_posts(15)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/posts/posts/?feed')
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_counts_and_has_liked(self):
+        self._create_posts(2)
+        Like.objects.create(user=self.other, post=Post.objects.latest('id'))
+        results = self.client.get('/api/posts/posts/?feed').data['results']
+        self.assertEqual([(p['likes_count'], p['comments_count'], p['has_liked']) for p in results],
+                         [(2, 1, True), (0, 1, False)])
+
+class TimelineTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def _feed_ids(self):
+        return [p['id'] for p in self.client.get('/api/posts/posts/?feed').data['results']]
+
+    def test_fan_out_on_create_and_delete(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        with mock.patch('posts.signals.fan_out_to_followers.delay', side_effect=fan_out_to_followers) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                post = Post.objects.create(user=self.other, caption='hello')
+        delay.assert_called_once_with(post.pk)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+        self.assertEqual(self._feed_ids(), [post.id])
+        post.delete()
+        self.assertEqual(self._feed_ids(), [])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        post = Post.objects.create(user=self.other, caption='before follow')
+        own = Post.objects.create(user=self.user, caption='mine')
+        self.client.post(f'/api/users/users/{self.other.id}/follow/')
+        self.assertEqual(self._feed_ids(), [own.id, post.id])
+        self.client.delete(f'/api/users/users/{self.other.id}/follow/')
+        self.assertEqual(self._feed_ids(), [own.id])
+
+    def test_bulk_follow_backfills_after_commit(self):
+        post = Post.objects.create(user=self.other, caption='before follow')
+        with mock.patch('posts.signals.backfill_home_timeline.delay', side_effect=backfill_home_timeline) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/users/users/follow/bulk/', {'users': [self.other.id]}, format='json')
+        delay.assert_called_once_with(self.user.id, [self.other.id])
+        self.assertEqual(self._feed_ids(), [post.id])
+
+    def test_hidden_posts_do_not_cut_the_page_short(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        with fan_out_inline(self):
+            shown = [Post.objects.create(user=self.other, caption=f'old {i}') for i in range(3)]
+            hidden = [Post.objects.create(user=self.other, caption=f'new {i}') for i in range(25)]
+        # Expired but not swept yet: still in the timeline, filtered out at read time
+        Post.objects.filter(id__in=[p.id for p in hidden]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._feed_ids(), [p.id for p in reversed(shown)])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_high_follower_accounts_merge_at_read_time(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        with fan_out_inline(self):
+            post = Post.objects.create(user=self.other, caption='celebrity')
+        post.refresh_from_db()
+        self.assertTrue(post.fanout_skipped)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self._feed_ids(), [post.id])
+
+    @override_settings(TIMELINE_BACKEND='posts.timeline.InMemoryTimelineBackend')
+    def test_in_memory_backend(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        with fan_out_inline(self):
+            post = Post.objects.create(user=self.other, caption='hello')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self._feed_ids(), [post.id])
+        Follow.objects.filter(follower=self.user).delete()
+        self.assertEqual(self._feed_ids(), [])
+
+class TrendingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_old_engagement_decays(self):
+        now = trending.EPOCH + timedelta(days=30)
+        old = trending.compute_score(now - timedelta(hours=48), like_times=[now - timedelta(hours=48)] * 20)
+        new = trending.compute_score(now, like_times=[now])
+        self.assertGreater(new, old)
+
+    def test_incremental_updates_match_recompute(self):
+        post = Post.objects.create(user=self.user, caption='hello')
+        Like.objects.create(user=self.other, post=post)
+        Comment.objects.create(user=self.other, post=post, text='nice')
+        comment = Comment.objects.create(user=self.user, post=post, text='thanks')
+        comment.delete()
+        post.refresh_from_db()
+        incremental = post.trending_score
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recompute_trending', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertAlmostEqual(incremental, post.trending_score, places=6)
+        # Recomputed under a lock, so a concurrent like's increment can't be overwritten
+        self.assertTrue(any('FOR UPDATE' in q['sql'] for q in queries))
+
+    def test_trending_orders_by_score(self):
+        liked = Post.objects.create(user=self.other, caption='liked')
+        newer = Post.objects.create(user=self.other, caption='newer')
+        Like.objects.create(user=self.user, post=liked)
+        Comment.objects.create(user=self.user, post=liked, text='wow')
+        results = self.client.get('/api/posts/posts/?trending').data['results']
+        self.assertEqual([p['id'] for p in results], [liked.id, newer.id])
+
+class PostSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, term, **params):
+        response = self.client.get('/api/posts/posts/', {'search': term, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_ranked_full_text_and_substring_matches(self):
+        once = Post.objects.create(user=self.user, caption='Sunset at the beach')
+        twice = Post.objects.create(user=self.user, caption='Beach day, best beaches ever')
+        partial = Post.objects.create(user=self.user, caption='#beachlife')
+        Post.objects.create(user=self.user, caption='Mountains')
+        ids = [p['id'] for p in self._search('beach')['results']]
+        self.assertEqual(ids, [twice.id, once.id, partial.id])
+
+    def test_search_pages_and_follows_edits(self):
+        posts = [Post.objects.create(user=self.user, caption=f'coffee number {i}') for i in range(3)]
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            first = self._search('coffee')
+            second = self._search('coffee', cursor=first['next'])
+        self.assertEqual(len(first['results']) + len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        self.client.put(f'/api/posts/posts/{posts[0].id}/', {'caption': 'tea instead'}, format='json')
+        self.assertEqual(len(self._search('coffee')['results']), 2)
+        self.assertEqual([p['id'] for p in self._search('tea')['results']], [posts[0].id])
+
+class PostCounterTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+        self.client.force_authenticate(user=self.user)
+
+    def test_like_toggle_maintains_counter(self):
+        response = self.client.post(f'/api/posts/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'liked': True, 'likes_count': 1})
+        response = self.client.post(f'/api/posts/posts/{self.post.id}/like/')
+        self.assertEqual(response.data, {'liked': False, 'likes_count': 0})
+
+    def test_comments_maintain_counter(self):
+        response = self.client.post('/api/posts/comments/', {'post': self.post.id, 'text': 'first'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(f'/api/posts/posts/{self.post.id}/').data['comments_count'], 1)
+        self.client.delete(f"/api/posts/comments/{response.data['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=3)
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('reconcile_post_counters', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+        self.assertIn('repaired 1', out.getvalue())
+        # Counted and written under a lock, so a concurrent like can't be overwritten
+        self.assertTrue(any('FOR UPDATE' in q['sql'] for q in queries))
+
+class ConcurrentEngagementTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+
+    def _concurrently(self, request, times=4):
+        barrier = threading.Barrier(times)
+        statuses = []
+
+        def run():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            barrier.wait()
+            statuses.append(request(client).status_code)
+            connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(times)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_concurrent_toggles_count_each_change_once(self):
+        Like.objects.create(user=self.user, post=self.post)
+        self._concurrently(lambda client: client.post(f'/api/posts/posts/{self.post.id}/like/'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, Like.objects.filter(post=self.post).count())
+
+    def test_concurrent_comment_deletes(self):
+        comment = Comment.objects.create(user=self.user, post=self.post, text='once')
+        statuses = self._concurrently(lambda client: client.delete(f'/api/posts/comments/{comment.id}/'))
+        self.assertEqual(sorted(statuses), [204, 404, 404, 404])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+class ExpirySweepTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        Follow.objects.create(follower=self.other, following=self.user)
+
+    def test_sweeper_deactivates_in_chunks(self):
+        with fan_out_inline(self):
+            expired = [Post.objects.create(user=self.user, caption=f'blink {i}') for i in range(5)]
+            live = Post.objects.create(user=self.user, caption='still here')
+            permanent = Post.objects.create(user=self.user, caption='forever', post_type='permanent')
+        Post.objects.filter(id__in=[p.id for p in expired]).update(expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('expire_posts', '--batch-size', '2', stdout=out)
+        self.assertIn('Expired 5 posts', out.getvalue())
+        self.assertEqual(set(Post.objects.filter(is_active=True)), {live, permanent})
+        self.assertEqual(list(TimelineEntry.objects.values_list('post_id', flat=True).order_by('post_id')), [live.id, permanent.id])
+
+    def test_save_deactivates_expired_post_in_one_write(self):
+        post = Post.objects.create(user=self.user, caption='blink')
+        post.expires_at = timezone.now() - timedelta(seconds=1)
+        with self.assertNumQueries(2):  # the UPDATE and the timeline cleanup
+            post.save(update_fields=['expires_at'])
+        post.refresh_from_db()
+        self.assertFalse(post.is_active)
+
+class PostVisibilityTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_expired_posts_are_hidden_before_the_sweep(self):
+        post = Post.objects.create(user=self.user, caption='blink')
+        Post.objects.filter(pk=post.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(Post.objects.get(pk=post.pk).is_active)
+        self.assertEqual(self.client.get('/api/posts/posts/').data['results'], [])
+        self.assertEqual(self.client.get(f'/api/posts/posts/{post.id}/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_filter(self):
+        other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        mine = Post.objects.create(user=self.user, caption='mine')
+        Post.objects.create(user=other, caption='theirs')
+        results = self.client.get('/api/posts/posts/', {'user': self.user.id}).data['results']
+        self.assertEqual([p['id'] for p in results], [mine.id])
+
+
+PLANNER_SETTINGS = ('enable_seqscan', 'enable_bitmapscan', 'enable_sort')
+
+class PostQueryPlanTest(APITestCase):
+    """
+    The tables are tiny in tests, so sequential scans, bitmap scans and sorts
+    are disabled to check that an index *can* serve each hot query in order,
+    rather than what the planner would pick on a near-empty table.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        for i in range(100):
+            Post.objects.create(user=self.user if i % 10 == 0 else other, caption=f'post {i}')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE posts_post')
+            for setting in PLANNER_SETTINGS:
+                cursor.execute(f'SET {setting} = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            for setting in PLANNER_SETTINGS:
+                cursor.execute(f'RESET {setting}')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan on posts_post', plan)
+        self.assertIn(index_name, plan)
+
+    def test_feed_ranges_use_their_indexes(self):
+        timeline = TimelineEntry.objects.filter(owner=self.user).order_by('-post_created_at', '-post_id')[:21]
+        self.assertUsesIndex(timeline, 'timeline_owner_recent_idx')
+        skipped = Post.objects.filter(fanout_skipped=True, user_id__in=[self.user.id]).order_by('-created_at', '-id')[:21]
+        self.assertUsesIndex(skipped, 'post_fanout_skipped_idx')
+
+    def test_detail_uses_primary_key(self):
+        self.assertUsesIndex(Post.objects.visible().filter(pk=1), 'posts_post_pkey')
+
+    def test_user_posts_use_user_index(self):
+        posts = Post.objects.visible().filter(user=self.user).order_by('-created_at', '-id')[:21]
+        self.assertUsesIndex(posts, 'post_user_recent_idx')
+
+    def test_comment_page_uses_post_index(self):
+        comments = Comment.objects.filter(post_id=1).order_by('-created_at', '-id')[:21]
+        self.assertUsesIndex(comments, 'comment_post_recent_idx')
+
+class StreamingMockTransport(httpx.BaseTransport):
+    # httpx.MockTransport reads the whole body up front; hand the handler the unread stream instead
+    def __init__(self, handler):
+        self.handler = handler
+
+    def handle_request(self, request):
+        return self.handler(request)
+
+def use_local_storage(test):
+    root = tempfile.TemporaryDirectory()
+    test.addCleanup(root.cleanup)
+    test.enterContext(override_settings(STORAGE_BACKEND='qwik_backend.storage.LocalStorage', MEDIA_ROOT=root.name,
+                                        LOCAL_STORAGE_BASE_URL='https://cdn.example.com/'))
+    return root.name
+
+@override_settings(SUPABASE_URL='https://example.supabase.co', SUPABASE_ANON_KEY='anon-key')
+class MediaUploadTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.requests = []
+        self.storage = SupabaseStorage(transport=StreamingMockTransport(self._handle))
+        get_storage = mock.patch('posts.media.get_storage', return_value=self.storage)
+        get_storage.start()
+        self.addCleanup(get_storage.stop)
+
+    def _handle(self, request):
+        self.requests.append((request, [len(chunk) for chunk in request.stream]))
+        if request.url.path.startswith('/storage/v1/object/upload/sign/'):
+            return httpx.Response(200, json={'url': request.url.path[len('/storage/v1'):] + '?token=signed-token'})
+        return httpx.Response(200, json={})
+
+    def test_upload_is_streamed_in_chunks(self):
+        payload = SimpleUploadedFile('clip.mp4', b'x' * (CHUNK_SIZE * 2 + 10), content_type='video/mp4')
+        response = self.client.post('/api/posts/posts/', {'media': payload, 'media_type': 'video'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        request, sent = self.requests[0]
+        self.assertEqual(sent, [CHUNK_SIZE, CHUNK_SIZE, 10])
+        self.assertEqual(request.headers['Content-Length'], str(CHUNK_SIZE * 2 + 10))
+        self.assertEqual(request.headers['apikey'], 'anon-key')
+        self.assertTrue(response.data['media_url'].startswith('https://example.supabase.co/storage/v1/object/public/qwips/'))
+
+    def test_client_is_shared_between_requests(self):
+        http = self.storage.http
+        for name in ('a.jpg', 'b.jpg'):
+            media.upload_media(SimpleUploadedFile(name, name.encode(), content_type='image/jpeg'))
+        self.assertIs(self.storage.http, http)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_direct_upload_is_signed(self):
+        response = self.client.post('/api/posts/uploads/sign/', {'filename': 'photo.jpg'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['key'].startswith(f'uploads/{self.user.id}/'))
+        self.assertEqual(response.data['token'], 'signed-token')
+        self.assertEqual(response.data['upload_url'], f"https://example.supabase.co/storage/v1/object/upload/sign/qwips/{response.data['key']}?token=signed-token")
+
+    def test_create_with_direct_upload_key(self):
+        key = f'uploads/{self.user.id}/abc.jpg'
+        response = self.client.post('/api/posts/posts/', {'media_key': key, 'media_type': 'image'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['media_url'], media.public_url(key))
+
+    def test_rejects_someone_elses_key(self):
+        response = self.client.post('/api/posts/posts/', {'media_key': f'uploads/{self.user.id + 1}/abc.jpg'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_extension_is_sanitised(self):
+        response = self.client.post('/api/posts/uploads/sign/', {'filename': 'x.' + 'a' * 300}, format='json')
+        self.assertTrue(response.data['key'].endswith('.bin'))
+        for filename, ext in (('photo.JPG', 'jpg'), ('clip.m/../p4', 'bin'), ('a.j%20g', 'bin'), ('noext', 'bin')):
+            self.assertEqual(media._extension(filename), ext)
+
+    def test_unconfigured_storage_is_unavailable(self):
+        self.storage.url = None
+        response = self.client.post('/api/posts/uploads/sign/', {'filename': 'photo.jpg'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+class LocalStorageTest(APITestCase):
+    def test_upload_and_delete(self):
+        root = use_local_storage(self)
+        url = media.upload_media(SimpleUploadedFile('a.txt', b'hello'), key='media/a.txt')
+        self.assertEqual(url, 'https://cdn.example.com/media/a.txt')
+        with open(os.path.join(root, 'media', 'a.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+        media.delete_media(['media/a.txt'])
+        self.assertEqual(os.listdir(os.path.join(root, 'media')), [])
+
+    def test_keys_cannot_escape_root(self):
+        use_local_storage(self)
+        with self.assertRaises(StorageError):
+            media.upload_media(SimpleUploadedFile('a.txt', b'hello'), key='../a.txt')
+
+class ResumableUploadTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = use_local_storage(self)
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.enterContext(override_settings(UPLOAD_STAGING_DIR=staging.name))
+        self.payload = bytes(range(256)) * 40
+        response = self.client.post('/api/posts/uploads/', {
+            'filename': 'clip.mp4', 'content_type': 'video/mp4', 'size': len(self.payload)
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.url = f"/api/posts/uploads/{response.data['id']}/"
+
+    def _patch(self, offset, chunk):
+        return self.client.generic('PATCH', self.url, chunk, content_type='application/offset+octet-stream',
+                                   HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resume_and_complete(self):
+        self.assertEqual(self._patch(0, self.payload[:4000]).data['offset'], 4000)
+        # A retried chunk at a stale offset is rejected with the offset to resume from
+        response = self._patch(0, self.payload[:4000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '4000')
+        self.assertEqual(self.client.get(self.url).data['offset'], 4000)
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self._patch(4000, self.payload[4000:]).data['offset'], len(self.payload))
+
+        response = self.client.post(f'{self.url}complete/', {'caption': 'long video'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['media_type'], 'video')
+        stored = MediaObject.objects.get()
+        with open(os.path.join(self.media_root, stored.storage_key), 'rb') as f:
+            self.assertEqual(f.read(), self.payload)
+        self.assertEqual(self.client.post(f'{self.url}complete/').data['id'], response.data['id'])
+
+    def test_complete_locks_session(self):
+        self._patch(0, self.payload)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'{self.url}complete/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        locks = [q['sql'] for q in queries if 'FOR UPDATE' in q['sql']]
+        self.assertEqual(len(locks), 1)
+        self.assertIn('posts_uploadsession', locks[0])
+
+    def test_chunk_streams_without_row_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._patch(0, self.payload[:4000]).data['offset'], 4000)
+        self.assertFalse([q['sql'] for q in queries if 'FOR UPDATE' in q['sql']])
+
+    def test_chunk_in_flight_is_refused(self):
+        session_id = self.url.split('/')[-2]
+        with get_chunk_store().lock(session_id):
+            response = self._patch(0, self.payload[:4000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertEqual(self._patch(0, self.payload[:4000]).data['offset'], 4000)
+
+    def test_purge_abandoned_sessions(self):
+        self._patch(0, self.payload[:100])
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        call_command('purge_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.UPLOAD_STAGING_DIR), [])
+
+class MediaProcessingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        use_local_storage(self)
+
+    def _jpeg(self, size, color=(200, 40, 40)):
+        out = BytesIO()
+        Image.new('RGB', size, color).save(out, 'JPEG')
+        return out.getvalue()
+
+    def test_renditions_only_downscale(self):
+        renditions = processing.image_renditions(self._jpeg((800, 400)))
+        self.assertEqual([(w, h) for w, h, _ in renditions], [(320, 160), (640, 320)])
+        self.assertEqual(Image.open(BytesIO(renditions[0][2])).size, (320, 160))
+
+    def test_blurhash(self):
+        placeholder = processing.blurhash(self._jpeg((64, 48)))
+        self.assertEqual(len(placeholder), 28)  # 4x3 components
+        self.assertTrue(placeholder.startswith('L'))
+
+    def test_new_media_post_is_queued_after_commit(self):
+        with mock.patch('posts.signals.process_post_media.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                post = Post.objects.create(user=self.user, media_url='https://cdn.example.com/a.jpg', media_type='image')
+        delay.assert_called_once_with(post.pk)
+        self.assertEqual(post.processing_status, 'pending')
+
+    def test_only_stored_media_is_processed(self):
+        with mock.patch('posts.signals.process_post_media.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                post = Post.objects.create(user=self.user, media_url='http://169.254.169.254/latest/meta-data/',
+                                           media_type='image')
+        delay.assert_not_called()
+        self.assertEqual(post.processing_status, '')
+        with self.assertRaises(ValueError):
+            processing._download(post.media_url, BytesIO())
+
+    def test_download_stops_at_size_limit(self):
+        def fake_stream(method, url, **kwargs):
+            self.assertNotIn('follow_redirects', kwargs)
+            body = iter([b'x' * 600] * 10)  # streamed, no Content-Length
+            client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+            return client.stream(method, url, **kwargs)
+
+        target = BytesIO()
+        with override_settings(MEDIA_PROCESSING_MAX_BYTES=1000), mock.patch('httpx.stream', side_effect=fake_stream):
+            with self.assertRaisesMessage(ValueError, 'larger than 1000 bytes'):
+                processing._download('https://cdn.example.com/media/a.jpg', target)
+        self.assertLessEqual(len(target.getvalue()), 1000)
+
+    def test_task_records_renditions(self):
+        post = Post.objects.create(user=self.user, media_url='https://cdn.example.com/a.jpg', media_type='image')
+        image = self._jpeg((700, 700))
+
+        def fake_download(url, target):
+            target.write(image)
+            target.seek(0)
+
+        with mock.patch('posts.processing._download', side_effect=fake_download), \
+                mock.patch('posts.processing.upload_media', side_effect=lambda f, content_type, key: f'https://cdn.example.com/{key}'):
+            process_post_media(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.processing_status, 'ready')
+        self.assertEqual([r['url'] for r in post.renditions], [
+            f'https://cdn.example.com/renditions/{post.pk}/320.jpg',
+            f'https://cdn.example.com/renditions/{post.pk}/640.jpg',
+        ])
+        self.assertEqual(len(post.placeholder), 28)
+
+class MediaDeduplicationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = use_local_storage(self)
+        upload = mock.patch.object(LocalStorage, 'upload', autospec=True, side_effect=LocalStorage.upload)
+        self.upload = upload.start()
+        self.addCleanup(upload.stop)
+
+    def _post_image(self):
+        image = SimpleUploadedFile('photo.jpg', b'same bytes', content_type='image/jpeg')
+        response = self.client.post('/api/posts/posts/', {'media': image, 'media_type': 'image'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data['id'])
+
+    def test_identical_uploads_share_one_object(self):
+        first, second = self._post_image(), self._post_image()
+        self.assertEqual(self.upload.call_count, 1)
+        self.assertEqual(first.media_id, second.media_id)
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        self.assertEqual(first.media_url, f'https://cdn.example.com/media/{digest}.jpg')
+        self.assertEqual(MediaObject.objects.get().ref_count, 2)
+
+    def test_object_removed_with_last_reference(self):
+        first, second = self._post_image(), self._post_image()
+        stored = os.path.join(self.media_root, MediaObject.objects.get().storage_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaObject.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(stored))
+        Post.objects.filter(pk=second.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_posts', stdout=StringIO())
+        self.assertFalse(MediaObject.objects.exists())
+        self.assertFalse(os.path.exists(stored))
+        self.assertIsNone(Post.objects.get(pk=second.pk).media_id)
+
+    def test_upload_runs_outside_the_transaction(self):
+        depth = len(connection.atomic_blocks)  # the test case's own transaction
+        seen, upload = [], self.upload.side_effect
+        self.upload.side_effect = lambda *args: seen.append(len(connection.atomic_blocks)) or upload(*args)
+        self._post_image()
+        self.assertEqual(seen, [depth])
+
+    def test_orphan_reacquired_before_delete_is_kept(self):
+        post = self._post_image()
+        stored = os.path.join(self.media_root, MediaObject.objects.get().storage_key)
+        with self.captureOnCommitCallbacks() as callbacks:
+            post.delete()
+        # The same bytes arrive again before the delete of the orphan runs
+        self._post_image()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(MediaObject.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(stored))
+
+class PostDetailCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        detail_cache.reset_stats()
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='testpass123')
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='testpass123')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.url = f'/api/posts/posts/{self.post.pk}/'
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_second_read_is_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # only the viewer's has_liked
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['caption'], 'hello')
+        self.assertEqual(detail_cache.stats(), {'post.miss': 1, 'post.hit': 1})
+
+    def test_likes_and_comments_invalidate(self):
+        self.client.get(self.url)
+        self.client.post(f'{self.url}like/')
+        Comment.objects.create(user=self.viewer, post=self.post, text='nice')
+        response = self.client.get(self.url)
+        self.assertEqual((response.data['likes_count'], response.data['comments_count']), (1, 1))
+        self.assertTrue(response.data['has_liked'])
+        # has_liked is per viewer, even though the payload is shared
+        self.client.force_authenticate(user=self.author)
+        self.assertFalse(self.client.get(self.url).data['has_liked'])
+
+    def test_edits_to_post_and_author_invalidate(self):
+        self.client.get(self.url)
+        self.post.caption = 'edited'
+        self.post.save()
+        self.assertEqual(self.client.get(self.url).data['caption'], 'edited')
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(self.client.get(self.url).data['user']['username'], 'renamed')
+
+    def test_row_changed_elsewhere_is_rebuilt(self):
+        first = self.client.get(self.url)
+        # A write in another process: the row moves on, this process's cache version doesn't
+        Post.objects.filter(pk=self.post.pk).update(caption='changed', updated_at=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['caption'], 'changed')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_expired_post_is_not_served(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('expire_posts', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+        self.client.force_authenticate(user=self.user)
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_feed_not_modified_until_page_changes(self):
+        url = '/api/posts/posts/?feed'
+        first = self.client.get(url)
+        with self.assertNumQueries(4):  # timeline and own ranges, page, liked ids; no serialization
+            response = self._revalidate(url, first)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(response.content)
+
+        self.client.post(f'/api/posts/posts/{self.post.pk}/like/')
+        response = self._revalidate(url, first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'][0]['has_liked'])
+        Post.objects.create(user=self.user, caption='newer')
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_200_OK)
+
+    def test_pages_have_distinct_etags(self):
+        for i in range(3):
+            Post.objects.create(user=self.user, caption=f'post {i}')
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            first = self.client.get('/api/posts/posts/')
+            second = self.client.get('/api/posts/posts/', {'cursor': first.data['next']})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_detail_revalidation(self):
+        url = f'/api/posts/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self._revalidate(url, first).status_code, status.HTTP_304_NOT_MODIFIED)
+        Comment.objects.create(user=self.user, post=self.post, text='hi')
+        response = self._revalidate(url, first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['comments_count'], 1)
+        # Media processing updates rows without touching updated_at
+        Post.objects.filter(pk=self.post.pk).update(processing_status='ready')
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_200_OK)
+
+class LeanSerializationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.liked = Post.objects.create(user=self.user, caption='line\u2028break ✨ "quoted"', post_type='temporary')
+        self.other = Post.objects.create(user=self.user, media_url='https://cdn.example.com/a.jpg', media_type='image',
+                                         renditions=[{'width': 320, 'height': 240, 'url': 'https://cdn.example.com/r.jpg'}])
+        Like.objects.create(user=self.user, post=self.liked)
+        Comment.objects.create(user=self.user, post=self.other, text='first')
+
+    def test_posts_render_identically(self):
+        context = {'liked_post_ids': {self.liked.pk}}
+        drf = PostSerializer(Post.objects.select_related('user').order_by('id'), many=True, context=context).data
+        lean = LeanPostSerializer(context).many(Post.objects.order_by('id').values(*LeanPostSerializer().lookups))
+        self.assertEqual(ORJSONRenderer().render(lean), JSONRenderer().render(drf))
+
+    def test_comments_render_identically(self):
+        drf = CommentSerializer(Comment.objects.select_related('user'), many=True).data
+        lean = LeanCommentSerializer().many(Comment.objects.values(*LeanCommentSerializer().lookups))
+        self.assertEqual(ORJSONRenderer().render(lean), JSONRenderer().render(drf))
+
+    def test_renderer_matches_drf_for_other_types(self):
+        data = {'when': timezone.now(), 'error': _('Not found.'), 1: [None, True, 1.5]}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_serializers', rows=[5], repeat=1, stdout=out)
+        self.assertIn('posts', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
+
+class CommentListingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(user=self.user, caption='busy')
+        self.quiet = Post.objects.create(user=self.user, caption='quiet')
+        self.comments = [Comment.objects.create(user=self.user, post=self.post, text=f'c{i}') for i in range(25)]
+        Comment.objects.create(user=self.user, post=self.quiet, text='only one')
+
+    def test_comments_are_paginated_newest_first(self):
+        url = f'/api/posts/posts/{self.post.pk}/comments/'
+        with self.assertNumQueries(2):  # post visibility + one page, no Post join
+            first = self.client.get(url)
+        self.assertEqual([c['text'] for c in first.data['results']], [f'c{i}' for i in range(24, 4, -1)])
+        self.assertEqual(first.data['results'][0]['post'], self.post.pk)
+        second = self.client.get(url, {'cursor': first.data['next']})
+        self.assertEqual([c['text'] for c in second.data['results']], ['c4', 'c3', 'c2', 'c1', 'c0'])
+        self.assertIsNone(second.data['next'])
+
+    def test_comment_list_by_post(self):
+        response = self.client.get('/api/posts/comments/', {'post': self.quiet.pk})
+        self.assertEqual([c['text'] for c in response.data['results']], ['only one'])
+        self.assertEqual(self.client.get('/api/posts/comments/', {'post': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_feed_comment_preview(self):
+        with self.assertNumQueries(3):  # page, liked ids, previews
+            response = self.client.get('/api/posts/posts/', {'comments': 2})
+        previews = {item['id']: [c['text'] for c in item['latest_comments']] for item in response.data['results']}
+        self.assertEqual(previews, {self.post.pk: ['c24', 'c23'], self.quiet.pk: ['only one']})
+        self.assertNotIn('latest_comments', self.client.get('/api/posts/posts/').data['results'][0])
+
+class BatchEndpointsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.posts = [Post.objects.create(user=self.user, caption=f'post {i}') for i in range(3)]
+        Like.objects.create(user=self.user, post=self.posts[1])
+
+    def test_batch_hydration(self):
+        a, b, c = self.posts
+        gone = Post.objects.create(user=self.user, is_active=False)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/posts/posts/batch/', {'ids': f'{c.pk},{b.pk},{gone.pk},{c.pk}'})
+        self.assertEqual([p['id'] for p in response.data['results']], [c.pk, b.pk])
+        self.assertEqual([p['has_liked'] for p in response.data['results']], [False, True])
+        self.assertEqual(response.data['missing'], [gone.pk])
+        self.assertEqual(self.client.get('/api/posts/posts/batch/', {'ids': '1,x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_likes_are_idempotent(self):
+        a, b, c = self.posts
+        intents = {'likes': [
+            {'post': a.pk, 'liked': True}, {'post': b.pk, 'liked': False},
+            {'post': c.pk, 'liked': False}, {'post': 999999, 'liked': True},
+        ]}
+        for _ in range(2):
+            response = self.client.post('/api/posts/posts/likes/bulk/', intents, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['results'], [
+                {'post': a.pk, 'liked': True, 'likes_count': 1},
+                {'post': b.pk, 'liked': False, 'likes_count': 0},
+                {'post': c.pk, 'liked': False, 'likes_count': 0},
+            ])
+            self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(set(Like.objects.values_list('post_id', flat=True)), {a.pk})
+        # Trending scores follow the likes: b is back to its creation-only score
+        b.refresh_from_db()
+        self.assertAlmostEqual(b.trending_score, trending.event_term(b.created_at, 'post'), places=6)
+        a.refresh_from_db()
+        self.assertGreater(a.trending_score, trending.event_term(a.created_at, 'post'))
+
+    def test_bulk_like_validation(self):
+        response = self.client.post('/api/posts/posts/likes/bulk/', {'likes': [{'post': 'x'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = {'likes': [{'post': i + 1, 'liked': True} for i in range(101)]}
+        self.assertEqual(self.client.post('/api/posts/posts/likes/bulk/', too_many, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+class PostAudienceTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='testpass123')
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='testpass123')
+        self.client.force_authenticate(user=self.viewer)
+        self.posts = {
+            audience: Post.objects.create(user=self.author, caption=f'sunrise {audience}', audience=audience)
+            for audience, _ in Post.AUDIENCE_CHOICES
+        }
+
+    def visible(self):
+        results = self.client.get('/api/posts/posts/', {'user': self.author.id}).data['results']
+        return {p['audience'] for p in results}
+
+    def test_friends_and_close_circle(self):
+        self.assertEqual(self.visible(), {'public'})
+        Follow.objects.create(follower=self.viewer, following=self.author)
+        self.assertEqual(self.visible(), {'public'})  # following alone is not friendship
+        Follow.objects.create(follower=self.author, following=self.viewer)
+        self.assertEqual(self.visible(), {'public', 'friends'})
+        CloseCircleMember.objects.create(owner=self.author, member=self.viewer)
+        self.assertEqual(self.visible(), {'public', 'friends', 'close_circle'})
+        Follow.objects.filter(follower=self.author).delete()
+        self.assertEqual(self.visible(), {'public', 'close_circle'})
+        CloseCircleMember.objects.filter(owner=self.author).delete()
+        self.assertEqual(self.visible(), {'public'})
+        self.assertFalse(Audience.objects.exists())
+
+    def test_hidden_posts_are_not_found(self):
+        hidden = self.posts['friends']
+        self.assertEqual(self.client.get(f'/api/posts/posts/{hidden.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(f'/api/posts/posts/{hidden.id}/like/').status_code, status.HTTP_404_NOT_FOUND)
+        batch = self.client.get('/api/posts/posts/batch/', {'ids': ','.join(str(p.id) for p in self.posts.values())})
+        self.assertEqual([p['audience'] for p in batch.data['results']], ['public'])
+        search = self.client.get('/api/posts/posts/', {'search': 'sunrise'}).data['results']
+        self.assertEqual([p['audience'] for p in search], ['public'])
+
+    def test_hidden_post_comments(self):
+        hidden = self.posts['friends']
+        comment = Comment.objects.create(user=self.author, post=hidden, text='friends only')
+        response = self.client.get('/api/posts/comments/', {'post': hidden.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'/api/posts/comments/{comment.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post('/api/posts/comments/', {'post': hidden.id, 'text': 'hi'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('post', response.data)
+        public = self.posts['public']
+        self.assertEqual(self.client.post('/api/posts/comments/', {'post': public.id, 'text': 'hi'}).status_code,
+                         status.HTTP_201_CREATED)
+        self.assertEqual(len(self.client.get('/api/posts/comments/', {'post': public.id}).data['results']), 1)
+
+    def test_authors_see_their_own_posts(self):
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.visible(), {'public', 'friends', 'close_circle'})
@@ -0,0 +1,209 @@
+"""
+Materialized home timelines (fan-out on write).
+
+When a post is created its id is pushed into the timeline of every follower
+(by a Celery task, after commit), so reading the feed is a range scan of the
+viewer's own timeline instead of a join over everyone they follow. Authors
+with more than TIMELINE_FANOUT_LIMIT followers are not fanned out; their
+posts are flagged `fanout_skipped` and merged into feeds at read time.
+
+The backend is chosen with the TIMELINE_BACKEND setting.
+"""
+import heapq
+import threading
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from users.graph import following_ids
+from users.models import Follow
+from .models import Post, TimelineEntry
+
+DEFAULT_BACKEND = 'posts.timeline.DatabaseTimelineBackend'
+
+
+def _newest(queryset, created_field, id_field, after, limit):
+    """Up to `limit` (created_at, id) keys of `queryset`, newest first, below the key `after`."""
+    if after is not None:
+        created_at, pk = after
+        queryset = queryset.filter(
+            Q(**{f'{created_field}__lt': created_at}) | Q(**{created_field: created_at, f'{id_field}__lt': pk})
+        )
+    return list(queryset.order_by(f'-{created_field}', f'-{id_field}').values_list(created_field, id_field)[:limit])
+
+
+class BaseTimelineBackend:
+    def add(self, post, owner_ids):
+        """Push one post into the timelines of `owner_ids`."""
+        raise NotImplementedError
+
+    def add_posts(self, owner_id, posts):
+        """Push several posts into one timeline (used when following someone)."""
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        """Drop posts from every timeline (deleted or expired)."""
+        raise NotImplementedError
+
+    def trim(self, owner_id, author_id):
+        """Drop an author's posts from one timeline (unfollow)."""
+        raise NotImplementedError
+
+    def recent(self, owner_id, after, limit):
+        """
+        Up to `limit` (created_at, post_id) keys from a timeline, newest first,
+        starting below the key `after` (None for the first page).
+        """
+        raise NotImplementedError
+
+    def backfill(self, owner_id, author_id):
+        limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+        posts = (Post.objects.filter(user_id=author_id, is_active=True, fanout_skipped=False)
+                 .order_by('-created_at')[:limit])
+        self.add_posts(owner_id, list(posts))
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    batch_size = 1000
+
+    def add(self, post, owner_ids):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(owner_id=owner_id, post=post, post_created_at=post.created_at) for owner_id in owner_ids),
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+
+    def add_posts(self, owner_id, posts):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(owner_id=owner_id, post=post, post_created_at=post.created_at) for post in posts),
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+
+    def remove(self, post_ids):
+        TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+
+    def trim(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, post__user_id=author_id).delete()
+
+    def recent(self, owner_id, after, limit):
+        # timeline_owner_recent_idx
+        return _newest(TimelineEntry.objects.filter(owner_id=owner_id), 'post_created_at', 'post_id', after, limit)
+
+
+class InMemoryTimelineBackend(BaseTimelineBackend):
+    """
+    Process-local stand-in for tests and development.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timelines = defaultdict(set)
+        self._posts = {}  # post id -> (created_at, author id)
+
+    def add(self, post, owner_ids):
+        with self._lock:
+            self._posts[post.pk] = (post.created_at, post.user_id)
+            for owner_id in owner_ids:
+                self._timelines[owner_id].add(post.pk)
+
+    def add_posts(self, owner_id, posts):
+        with self._lock:
+            for post in posts:
+                self._posts[post.pk] = (post.created_at, post.user_id)
+                self._timelines[owner_id].add(post.pk)
+
+    def remove(self, post_ids):
+        post_ids = set(post_ids)
+        with self._lock:
+            for timeline in self._timelines.values():
+                timeline -= post_ids
+            for post_id in post_ids:
+                self._posts.pop(post_id, None)
+
+    def trim(self, owner_id, author_id):
+        with self._lock:
+            timeline = self._timelines.get(owner_id, set())
+            timeline -= {pid for pid in timeline if self._posts[pid][1] == author_id}
+
+    def recent(self, owner_id, after, limit):
+        with self._lock:
+            keys = [(self._posts[pid][0], pid) for pid in self._timelines.get(owner_id, ())]
+        return heapq.nlargest(limit, (key for key in keys if after is None or key < after))
+
+
+_backend = None
+
+
+def get_timeline_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'TIMELINE_BACKEND', DEFAULT_BACKEND))()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(*, setting, **kwargs):
+    global _backend
+    if setting == 'TIMELINE_BACKEND':
+        _backend = None
+
+
+def fan_out(post):
+    """
+    Push a new post to its author's followers. Returns False (and flags the post)
+    when the author has too many followers and the post is merged at read time instead.
+    """
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+    # The denormalized counter settles large accounts without reading their follower list
+    too_many = post.user.followers_count > limit
+    if not too_many:
+        follower_ids = list(
+            Follow.objects.filter(following_id=post.user_id).values_list('follower_id', flat=True)[:limit + 1]
+        )
+        too_many = len(follower_ids) > limit
+    if too_many:
+        Post.objects.filter(pk=post.pk).update(fanout_skipped=True)
+        post.fanout_skipped = True
+        return False
+    if follower_ids:
+        get_timeline_backend().add(post, follower_ids)
+    return True
+
+
+def home_timeline(user, posts, after=None, size=20):
+    """
+    Restrict `posts` to the next `size` + 1 posts of the user's home feed, newest
+    first, starting below the (created_at, id) key `after`.
+
+    The viewer's timeline, their own posts and posts by followed high-follower
+    accounts are each read as an index range in feed order and merged. `posts`
+    then applies visibility; if it hides some candidates the scan moves on, so a
+    full page (plus one, for the paginator's next cursor) comes back unless the
+    feed runs out.
+    """
+    backend = get_timeline_backend()
+    sources = [
+        lambda after, limit: backend.recent(user.id, after, limit),
+        # post_user_recent_idx
+        lambda after, limit: _newest(Post.objects.filter(user_id=user.id), 'created_at', 'id', after, limit),
+    ]
+    if followed := following_ids(user.id):
+        # post_fanout_skipped_idx
+        skipped = Post.objects.filter(fanout_skipped=True, user_id__in=followed)
+        sources.append(lambda after, limit: _newest(skipped, 'created_at', 'id', after, limit))
+    limit = size + 1
+    found = set()
+    while len(found) < limit:
+        merged = heapq.merge(*(source(after, limit) for source in sources), reverse=True)
+        keys = list(islice(merged, limit))
+        ids = [pk for _, pk in keys]
+        if len(keys) < limit:
+            # The feed ends in this window; the returned queryset applies visibility to it
+            found.update(ids)
+            break
+        found.update(posts.filter(id__in=ids).values_list('id', flat=True))
+        after = keys[-1]
+    return posts.filter(id__in=found)
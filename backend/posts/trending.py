@@ -0,0 +1,75 @@
+"""
+Time-decayed trending scores.
+
+Scores use forward decay: every event (the post itself, a like, a comment)
+contributes `weight * exp((t - EPOCH) / TAU)`. Ranking by that sum is the same
+as ranking by the usual decayed score at any moment, but new events never have
+to re-decay old ones, so a like or comment is a single incremental UPDATE.
+Scores are stored as natural logs so they stay finite as time moves on.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Least, Ln
+from django.utils import timezone
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+WEIGHTS = {
+    'post': 1.0,
+    'like': 1.0,
+    'comment': 2.0,
+}
+
+# exp() of anything below this is lost in double precision anyway; clamping also
+# keeps PostgreSQL from raising on underflow.
+_MIN_EXPONENT = -50.0
+
+
+def _tau():
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE', timedelta(hours=6))
+    return half_life.total_seconds() / math.log(2)
+
+
+def event_term(timestamp, kind):
+    """Log-space contribution of one event."""
+    return math.log(WEIGHTS[kind]) + (timestamp - EPOCH).total_seconds() / _tau()
+
+
+def initial_score():
+    """Score of a post with no engagement yet (its creation event)."""
+    return event_term(timezone.now(), 'post')
+
+
+def combine(terms):
+    """log(sum(exp(term))) computed without overflow."""
+    terms = list(terms)
+    peak = max(terms)
+    return peak + math.log(sum(math.exp(t - peak) for t in terms))
+
+
+def add_expression(term, field='trending_score'):
+    # log(exp(s) + exp(x)) = max(s, x) + ln(1 + exp(-|s - x|))
+    term = Value(term)
+    return Greatest(F(field), term) + Ln(
+        Value(1.0) + Exp(Greatest(-Abs(F(field) - term), Value(_MIN_EXPONENT)))
+    )
+
+
+def remove_expression(term, field='trending_score'):
+    # log(exp(s) - exp(x)) = s + ln(1 - exp(x - s)); the creation event keeps x < s
+    term = Value(term)
+    return F(field) + Ln(Greatest(
+        Value(1.0) - Exp(Greatest(Least(term - F(field), Value(0.0)), Value(_MIN_EXPONENT))),
+        Value(1e-9),
+    ))
+
+
+def compute_score(created_at, like_times=(), comment_times=()):
+    """Score from scratch, used by the periodic recompute."""
+    terms = [event_term(created_at, 'post')]
+    terms += [event_term(t, 'like') for t in like_times]
+    terms += [event_term(t, 'comment') for t in comment_times]
+    return combine(terms)
@@ -0,0 +1,32 @@
+"""
+Upload handlers that compute a SHA-256 of each file while Django receives it,
+so deduplication (posts.media.acquire_media) doesn't need a second pass.
+The digest is set as `sha256` on the resulting UploadedFile.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()  # before super(): the memory handler raises StopFutureHandlers
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self._sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
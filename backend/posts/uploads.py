@@ -0,0 +1,99 @@
+"""
+Staging for resumable uploads.
+
+Chunks are appended to a staging file per UploadSession until the upload is
+complete; the finished file is then streamed to storage. The store is chosen
+with the UPLOAD_STAGING_BACKEND setting.
+"""
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'posts.uploads.LocalChunkStore'
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadBusy(Exception):
+    """Another request is already writing to this upload."""
+
+
+class LocalChunkStore:
+    """Stages uploads as files on local disk (UPLOAD_STAGING_DIR)."""
+
+    def __init__(self):
+        default = Path(tempfile.gettempdir()) / 'qwik-uploads'
+        self.root = Path(getattr(settings, 'UPLOAD_STAGING_DIR', None) or default)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, session_id):
+        return self.root / f"{session_id}.part"
+
+    @contextmanager
+    def lock(self, session_id):
+        """
+        Exclusive, non-blocking claim on an upload for the duration of one chunk.
+        Raises UploadBusy instead of queueing behind a client that is still sending.
+        """
+        with open(self.path(session_id), 'ab') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy(session_id) from None
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, session_id, offset, stream, length):
+        """
+        Write up to `length` bytes from `stream` at `offset` and return how many
+        arrived. If the client drops mid-chunk, the bytes already received are
+        kept so it can resume from there instead of resending the chunk.
+        """
+        path = self.path(session_id)
+        written = 0
+        with open(path, 'r+b' if path.exists() else 'wb') as f:
+            f.seek(offset)
+            f.truncate()  # drop anything past the recorded offset (e.g. a write we never acknowledged)
+            try:
+                while written < length:
+                    block = stream.read(min(BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    written += len(block)
+            except OSError:
+                pass
+            f.flush()
+            os.fsync(f.fileno())
+        return written
+
+    def open(self, session_id):
+        return open(self.path(session_id), 'rb')
+
+    def delete(self, session_id):
+        self.path(session_id).unlink(missing_ok=True)
+
+
+_store = None
+
+
+def get_chunk_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'UPLOAD_STAGING_BACKEND', DEFAULT_BACKEND))()
+    return _store
+
+
+@receiver(setting_changed)
+def _reset_store(*, setting, **kwargs):
+    global _store
+    if setting in ('UPLOAD_STAGING_BACKEND', 'UPLOAD_STAGING_DIR'):
+        _store = None
@@ -2,17 +2,26 @@ from django.urls import path
 from .views import (
     PostListCreateAPIView, PostDetailAPIView, PostLikeToggleAPIView,
     PostConvertAPIView, PostCommentsAPIView, CommentListCreateAPIView,
-    CommentDetailAPIView
+    CommentDetailAPIView, DirectUploadAPIView, UploadSessionCreateAPIView,
+    UploadSessionAPIView, UploadSessionCompleteAPIView, PostBatchAPIView, BulkLikeAPIView
 )
 
 urlpatterns = [
     # Posts
     path('posts/', PostListCreateAPIView.as_view(), name='post-list-create'),
+    path('posts/batch/', PostBatchAPIView.as_view(), name='post-batch'),
+    path('posts/likes/bulk/', BulkLikeAPIView.as_view(), name='post-like-bulk'),
     path('posts/<int:pk>/', PostDetailAPIView.as_view(), name='post-detail'),
     path('posts/<int:pk>/like/', PostLikeToggleAPIView.as_view(), name='post-like-toggle'),
     path('posts/<int:pk>/convert/', PostConvertAPIView.as_view(), name='post-convert'),
     path('posts/<int:pk>/comments/', PostCommentsAPIView.as_view(), name='post-comments'),
 
+    # Media
+    path('uploads/sign/', DirectUploadAPIView.as_view(), name='upload-sign'),
+    path('uploads/', UploadSessionCreateAPIView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:pk>/', UploadSessionAPIView.as_view(), name='upload-session'),
+    path('uploads/<uuid:pk>/complete/', UploadSessionCompleteAPIView.as_view(), name='upload-session-complete'),
+
     # Comments
     path('comments/', CommentListCreateAPIView.as_view(), name='comment-list-create'),
     path('comments/<int:pk>/', CommentDetailAPIView.as_view(), name='comment-detail'),
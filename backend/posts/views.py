@@ -1,16 +1,71 @@
+from collections import defaultdict
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from django.core.files import File
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Count
-from .models import Post, Like, Comment
-from .serializers import PostSerializer, CommentSerializer
-import uuid
-from qwik_backend.settings import supabase as client
-
-
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.conf import settings
+from .models import Post, Like, Comment, UploadSession
+from .serializers import (
+    PostSerializer, CommentSerializer, UploadSessionSerializer, LeanPostSerializer, LeanCommentSerializer,
+    LikeIntentSerializer
+)
+from .engagement import apply_like_intents, delete_comment, toggle_like
+from .search import search_posts
+from .timeline import home_timeline
+from .uploads import UploadBusy, get_chunk_store
+from .media import (
+    MediaUnavailable, MediaUploadError, acquire_media, create_direct_upload,
+    is_direct_upload_key, public_url, release_media
+)
+from api import cache as detail_cache
+from api.etags import conditional_response, make_etag
+from api.lean import format_values
+from api.pagination import KeysetPagination
+from users.graph import following_ids
+
+
+# Everything that can change a post's representation without a new id (ETag input)
+VERSION_FIELDS = ('id', 'updated_at', 'likes_count', 'comments_count', 'processing_status', 'user__updated_at')
+
+
+def _payload_version(payload):
+    # VERSION_FIELDS as they appear in a serialized post
+    return (payload['id'], payload['updated_at'], payload['likes_count'], payload['comments_count'],
+            payload['processing_status'], payload['user']['updated_at'])
+
+# Most comments a feed item can embed with ?comments=N
+COMMENT_PREVIEW_MAX = 3
+
+# Most posts per batch hydration / bulk like request
+BATCH_MAX_POSTS = 50
+BULK_LIKE_MAX_INTENTS = 100
+
+
+def latest_comments(post_ids, limit, lean):
+    """The newest `limit` comments of each post, in one query: {post_id: [comment, ...]}."""
+    rows = Comment.objects.filter(post_id__in=post_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('post'), order_by=(F('created_at').desc(), F('id').desc())),
+    ).filter(position__lte=limit).order_by('post', 'position').values(*lean.lookups)
+    previews = defaultdict(list)
+    for row in rows:
+        previews[row['post']].append(lean.to_representation(row))
+    return previews
+
+
+def comment_page(request, comments, view):
+    """One keyset page of comments, newest first, as lean rows (no Post join)."""
+    lean = LeanCommentSerializer({'request': request})
+    paginator = KeysetPagination(('-created_at', '-id'))
+    page = paginator.paginate_queryset(comments.values(*lean.lookups), request, view=view)
+    return paginator.get_paginated_response(lean.many(page))
 
 
 class PostListCreateAPIView(APIView):
@@ -19,67 +74,256 @@ class PostListCreateAPIView(APIView):
 
     def get(self, request):
         # Build queryset similar to ViewSet
-        posts = Post.objects.filter(is_active=True).select_related('user').annotate(
-            likes_count=Count('likes_received'),
-            comments_count=Count('comments_received')
-        ).order_by('-created_at')
+        posts = Post.objects.visible().visible_to(request.user).select_related('user')
         user = request.user
+        ordering = ('-created_at', '-id')
 
-        # Feed logic
-        if 'feed' in request.query_params:
-            followed_users = user.following.all().values_list('following_id', flat=True)  # Assumes Follow model in users
-            posts = posts.filter(user_id__in=[user.id] + list(followed_users))
+        # Feed logic: applied below, once the page's cursor is known
+        feed = 'feed' in request.query_params
 
-        # Trending
-        elif 'trending' in request.query_params:
-            posts = posts.order_by('-likes_count', '-comments_count')
+        # Trending: precomputed decayed score, an index range scan (id breaks ties for the cursor)
+        if not feed and 'trending' in request.query_params:
+            ordering = ('-trending_score', '-id')
 
-        # Search
-        if search := request.query_params.get('search'):
-            posts = posts.filter(caption__icontains=search)
+        # A single user's posts (profile grid)
+        if user_id := request.query_params.get('user'):
+            if not user_id.isdigit():
+                return Response({'error': 'Invalid user id'}, status=status.HTTP_400_BAD_REQUEST)
+            posts = posts.filter(user_id=user_id)
 
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        # Search: ranked full-text match, best hits first
+        if search := request.query_params.get('search'):
+            if feed:
+                # Ranked rather than newest first, so not a timeline page: match the followed authors' posts
+                posts = posts.filter(user_id__in=[user.id, *following_ids(user.id)])
+            posts = search_posts(posts, search)
+            ordering = ('-rank', '-id')
+
+        # Latest comments embedded in each item
+        preview = request.query_params.get('comments', '0')
+        if not preview.isdigit():
+            return Response({'error': 'Invalid comments preview size'}, status=status.HTTP_400_BAD_REQUEST)
+        preview = min(int(preview), COMMENT_PREVIEW_MAX)
+
+        # Lean path: plain values() rows (with the ordering columns the cursor needs), no model instances
+        context = {'request': request}
+        lean = LeanPostSerializer(context)
+        sort_keys = [f.lstrip('-') for f in ordering if f.lstrip('-') not in lean.lookups]
+        paginator = KeysetPagination(ordering)
+        if feed and not search:
+            posts = home_timeline(user, posts, paginator.get_cursor_values(request, Post), paginator.page_size)
+        page = paginator.paginate_queryset(posts.values(*lean.lookups, *sort_keys), request, view=self)
+        context['liked_post_ids'] = set(
+            Like.objects.filter(user=user, post_id__in=[row['id'] for row in page]).values_list('post_id', flat=True)
+        )
+        previews = {}
+        if preview:
+            previews = latest_comments([row['id'] for row in page], preview, LeanCommentSerializer(context))
+        etag = make_etag(
+            sorted(request.query_params.items()), paginator.has_next,
+            [[row[f] for f in VERSION_FIELDS] for row in page], sorted(context['liked_post_ids']),
+            sorted(previews.items()),
+        )
+
+        def build():
+            results = lean.many(page)
+            if preview:
+                for item in results:
+                    item['latest_comments'] = previews.get(item['id'], [])
+            return paginator.get_paginated_response(results)
+
+        return conditional_response(request, etag, build)
 
     def post(self, request):
-        data = request.data.copy()
-        # Handle media upload if file is present
-        if 'media' in request.FILES:
-            file = request.FILES['media']
-            file_extension = file.name.split('.')[-1]
-            file_name = f"{uuid.uuid4()}.{file_extension}"
-            if client is None:
-                return Response({'error': 'Supabase service unavailable (Configuration check needed)'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-            try:
-                with file.open('rb') as f:
-                    res = client.storage.from_('qwips').upload(
-                        file_name,
-                        f.read(),
-                        file_options={'content-type': file.content_type, 'upsert': 'true'}
-                    )
-                if hasattr(res, 'error') and res.error:
-                    return Response({'error': f"Upload failed (Supabase API Error): {res.error}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                media_url = client.storage.from_('qwips').get_public_url(file_name)
-                data['media_url'] = media_url
-            except Exception as e:
-                return Response({'error': f'Supabase Upload Failed (API Call Error): {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Plain dict of the non-file fields: QueryDict.copy() would deep-copy the uploaded file
+        data = {key: value for key, value in request.data.items() if key != 'media'}
+        upload = request.FILES.get('media')
+        # Media the client already uploaded straight to storage via a signed URL
+        if upload is None and (media_key := data.pop('media_key', None)):
+            if not is_direct_upload_key(request.user, media_key):
+                return Response({'error': 'Invalid media key'}, status=status.HTTP_400_BAD_REQUEST)
+            data['media_url'] = public_url(media_key)
         serializer = PostSerializer(data=data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Uploaded file: reuse the stored copy of identical bytes, else stream it to storage.
+        # That happens before the transaction, which then only has to write the post.
+        media = None
+        if upload is not None:
+            try:
+                media = acquire_media(upload)
+            except MediaUnavailable as e:
+                return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            except MediaUploadError as e:
+                return Response({'error': f'Supabase Upload Failed (API Call Error): {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        try:
+            with transaction.atomic():
+                serializer.save(**({'media': media, 'media_url': media.url} if media else {}))
+        except BaseException:
+            if media is not None:
+                release_media([media.pk])
+            raise
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class DirectUploadAPIView(APIView):
+    """
+    POST: Get a pre-signed URL to upload media straight to storage.
+    Expects: {'filename': 'clip.mp4'}. Then create the post with {'media_key': key, ...}.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        filename = request.data.get('filename')
+        if not filename:
+            return Response({'error': 'filename required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = create_direct_upload(request.user, filename)
+        except MediaUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except MediaUploadError as e:
+            return Response({'error': f'Could not sign upload: {e}'}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+class UploadSessionCreateAPIView(APIView):
+    """
+    POST: Start a resumable video upload.
+    Expects: {'filename', 'content_type', 'size'}. Returns the session with its id and offset.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
         if serializer.is_valid():
-            post = serializer.save()
+            serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class UploadSessionAPIView(APIView):
+    """
+    GET/HEAD: Current offset, to resume after a failure (also in the Upload-Offset header).
+    PATCH: Append a chunk. Send the raw bytes as the body with an Upload-Offset header
+    equal to the current offset; a mismatch, or a chunk already in flight for the
+    same upload, returns 409 with the offset to resume from.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _offset_response(self, session, status_code=status.HTTP_200_OK):
+        response = Response({'id': session.id, 'offset': session.offset, 'size': session.size}, status=status_code)
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    def get(self, request, pk):
+        session = get_object_or_404(UploadSession.objects.filter(user=request.user), pk=pk)
+        return self._offset_response(session)
+
+    def patch(self, request, pk):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers required'}, status=status.HTTP_400_BAD_REQUEST)
+        max_chunk = getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024)
+        if not 0 < length <= max_chunk:
+            return Response({'error': f'Chunks must be between 1 and {max_chunk} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+        session = get_object_or_404(UploadSession.objects.filter(user=request.user), pk=pk)
+        if session.post_id:
+            return Response({'error': 'Upload already completed'}, status=status.HTTP_409_CONFLICT)
+        store = get_chunk_store()
+        # The staging lock keeps concurrent PATCHes for one session apart while the chunk
+        # streams in; no transaction is open meanwhile, so a slow client holds no row lock.
+        try:
+            with store.lock(session.pk):
+                session.refresh_from_db(fields=['offset'])
+                if offset != session.offset:
+                    return self._offset_response(session, status.HTTP_409_CONFLICT)
+                if offset + length > session.size:
+                    return Response({'error': 'Chunk exceeds declared size'}, status=status.HTTP_400_BAD_REQUEST)
+                written = store.append(session.pk, offset, request, length)
+                advanced = UploadSession.objects.filter(pk=session.pk, offset=offset, post__isnull=True).update(
+                    offset=offset + written, updated_at=timezone.now()
+                )
+        except UploadBusy:
+            advanced = 0
+        if not advanced:
+            session.refresh_from_db(fields=['offset'])
+            return self._offset_response(session, status.HTTP_409_CONFLICT)
+        session.offset = offset + written
+        return self._offset_response(session)
+
+class UploadSessionCompleteAPIView(APIView):
+    """
+    POST: Turn a fully received upload into a video Post.
+    Accepts the usual post fields (caption, post_type); repeating the call returns the same post.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        session = get_object_or_404(UploadSession.objects.filter(user=request.user), pk=pk)
+        if session.post_id:
+            return Response(PostSerializer(session.post, context={'request': request}).data)
+        if not session.is_complete:
+            return Response({'error': 'Upload incomplete', 'offset': session.offset}, status=status.HTTP_409_CONFLICT)
+        serializer = PostSerializer(data={**request.data, 'media_type': 'video'}, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        store = get_chunk_store()
+        try:
+            # Streamed to storage before the transaction, which only writes the rows
+            with store.open(session.pk) as f:
+                media = acquire_media(File(f, name=session.filename), content_type=session.content_type)
+        except MediaUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except MediaUploadError as e:
+            return Response({'error': f'Supabase Upload Failed (API Call Error): {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        try:
+            with transaction.atomic():
+                # A concurrent complete of the same session waits here, then finds the post made
+                session = UploadSession.objects.select_for_update().get(pk=session.pk)
+                if session.post_id or not session.is_complete:
+                    release_media([media.pk])
+                    if session.post_id:
+                        return Response(PostSerializer(session.post, context={'request': request}).data)
+                    return Response({'error': 'Upload incomplete', 'offset': session.offset}, status=status.HTTP_409_CONFLICT)
+                session.post = serializer.save(media=media, media_url=media.url)
+                session.save(update_fields=['post', 'updated_at'])
+        except BaseException:
+            release_media([media.pk])
+            raise
+        store.delete(session.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class PostDetailAPIView(APIView):
     parser_classes = [JSONParser]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        post = get_object_or_404(Post.objects.filter(is_active=True).select_related('user'), pk=pk)
-        serializer = PostSerializer(post, context={'request': request})
-        return Response(serializer.data)
+        # One indexed lookup gives the post's version and the viewer's has_liked
+        *version, has_liked = get_object_or_404(
+            Post.objects.visible().visible_to(request.user).filter(pk=pk).annotate(
+                has_liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=request.user)),
+            ).values_list(*VERSION_FIELDS, 'has_liked')
+        )
+        version = format_values(version)
+
+        def build():
+            post = get_object_or_404(Post.objects.visible().select_related('user'), pk=pk)
+            # has_liked is per viewer: resolved below, not cached
+            payload = PostSerializer(post, context={'liked_post_ids': set()}).data
+            timeout = None
+            if post.expires_at:
+                timeout = max(1, min(settings.DETAIL_CACHE_TIMEOUT, int((post.expires_at - timezone.now()).total_seconds())))
+            return dict(payload), [('user', post.user_id)], timeout
+
+        # A cached payload older than the row is rebuilt, and the ETag is taken from the payload served
+        payload = detail_cache.get_or_build('post', pk, build, is_current=lambda p: _payload_version(p) == version)
+        etag = make_etag(_payload_version(payload), has_liked)
+        return conditional_response(request, etag, lambda: Response({**payload, 'has_liked': has_liked}))
 
     def put(self, request, pk):  # Update (e.g., edit caption)
-        post = get_object_or_404(Post.objects.filter(is_active=True, user=request.user), pk=pk)
+        post = get_object_or_404(Post.objects.visible().filter(user=request.user), pk=pk)
         serializer = PostSerializer(post, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
@@ -96,22 +340,58 @@ class PostLikeToggleAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        post = get_object_or_404(Post.objects.filter(is_active=True), pk=pk)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        if not created:
-            like.delete()
-            liked = False
-        else:
-            liked = True
-        likes_count = post.likes_received.count()
-        return Response({'liked': liked, 'likes_count': likes_count}, status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED)
+        post = get_object_or_404(Post.objects.visible().visible_to(request.user).only('id'), pk=pk)
+        liked, likes_count = toggle_like(request.user, post.pk)
+        return Response({'liked': liked, 'likes_count': likes_count}, status=status.HTTP_201_CREATED if liked else status.HTTP_200_OK)
+
+class PostBatchAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        # ?ids=3,1,2 -> those posts in that order; ids that aren't visible are listed as missing
+        raw = [i for i in request.query_params.get('ids', '').split(',') if i]
+        if not raw or not all(i.isdigit() for i in raw):
+            return Response({'error': 'ids must be a comma-separated list of post ids'}, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(int(i) for i in raw))
+        if len(ids) > BATCH_MAX_POSTS:
+            return Response({'error': f'At most {BATCH_MAX_POSTS} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lean = LeanPostSerializer({'request': request})
+        rows = {row['id']: row for row in Post.objects.visible().visible_to(request.user).filter(id__in=ids).values(*lean.lookups)}
+        lean.context['liked_post_ids'] = set(
+            Like.objects.filter(user=request.user, post_id__in=rows).values_list('post_id', flat=True)
+        )
+        return Response({
+            'results': [lean.to_representation(rows[i]) for i in ids if i in rows],
+            'missing': [i for i in ids if i not in rows],
+        })
+
+class BulkLikeAPIView(APIView):
+    parser_classes = [JSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        # {"likes": [{"post": 1, "liked": true}, ...]}; replaying the same intents is a no-op
+        likes = request.data.get('likes') if isinstance(request.data, dict) else None
+        serializer = LikeIntentSerializer(data=likes, many=True, max_length=BULK_LIKE_MAX_INTENTS)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        intents = {intent['post']: intent['liked'] for intent in serializer.validated_data}  # last intent wins
+        state = apply_like_intents(request.user, intents)
+        return Response({
+            'results': [
+                {'post': post_id, 'liked': state[post_id][0], 'likes_count': state[post_id][1]}
+                for post_id in intents if post_id in state
+            ],
+            'missing': [post_id for post_id in intents if post_id not in state],
+        })
 
 class PostConvertAPIView(APIView):
     parser_classes = [JSONParser]
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        post = get_object_or_404(Post.objects.filter(is_active=True), pk=pk)
+        post = get_object_or_404(Post.objects.visible(), pk=pk)
         if post.user != request.user or post.post_type != 'temporary':
             return Response({'error': 'Unauthorized or not temporary'}, status=status.HTTP_403_FORBIDDEN)
         post.post_type = 'permanent'
@@ -127,10 +407,8 @@ class PostCommentsAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        post = get_object_or_404(Post.objects.filter(is_active=True), pk=pk)
-        comments = post.comments_received.select_related('user').order_by('-created_at')
-        serializer = CommentSerializer(comments, many=True, context={'request': request})
-        return Response(serializer.data)
+        get_object_or_404(Post.objects.visible().visible_to(request.user).only('id'), pk=pk)
+        return comment_page(request, Comment.objects.filter(post_id=pk), self)
 
 class CommentListCreateAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -139,14 +417,16 @@ class CommentListCreateAPIView(APIView):
         post_id = request.query_params.get('post')
         if not post_id:
             return Response({'error': 'Post ID required'}, status=status.HTTP_400_BAD_REQUEST)
-        comments = Comment.objects.filter(post_id=post_id).select_related('user', 'post').order_by('-created_at')
-        serializer = CommentSerializer(comments, many=True, context={'request': request})
-        return Response(serializer.data)
+        if not post_id.isdigit():
+            return Response({'error': 'Invalid post id'}, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(Post.objects.visible().visible_to(request.user).only('id'), pk=post_id)
+        return comment_page(request, Comment.objects.filter(post_id=post_id), self)
 
     def post(self, request):
         serializer = CommentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            comment = serializer.save(user=request.user)
+            with transaction.atomic():  # Comment insert + post.comments_count bump
+                comment = serializer.save(user=request.user)
             # TODO: Trigger notification to post owner
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -156,7 +436,10 @@ class CommentDetailAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        comment = get_object_or_404(Comment.objects.select_related('user', 'post'), pk=pk)
+        comment = get_object_or_404(
+            Comment.objects.filter(post__in=Post.objects.visible().visible_to(request.user)).select_related('user', 'post'),
+            pk=pk,
+        )
         serializer = CommentSerializer(comment, context={'request': request})
         return Response(serializer.data)
 
@@ -169,8 +452,8 @@ class CommentDetailAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
-        comment = get_object_or_404(Comment.objects.filter(user=request.user), pk=pk)
-        comment.delete()
+        if not delete_comment(request.user, pk):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     
@@ -0,0 +1,19 @@
+"""
+Celery app for background work (media processing).
+
+Start a worker with:
+    celery -A qwik_backend worker --concurrency=4
+
+For more information on this file, see
+https://docs.celeryq.dev/en/stable/django/first-steps-with-django.html
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "qwik_backend.settings")
+
+app = Celery("qwik_backend")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
@@ -54,49 +55,29 @@ INSTALLED_APPS = [
     'notifications',
 ]
 
-# --- Supabase Configuration ---
-# from .supabase_client import initialize_supabase_client
-
-# SUPABASE_CLIENT = initialize_supabase_client()
-# globals()['supabase'] = SUPABASE_CLIENT
-
-# --- SUPABASE CLIENT INITIALIZATION DEBUGGING ---
-from supabase import create_client 
+# --- Storage ---
+# Media storage backend; the client is created on first use (see qwik_backend.storage).
+# 'qwik_backend.storage.LocalStorage' writes under MEDIA_ROOT instead, for tests and offline work.
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'qwik_backend.storage.SupabaseStorage')
+STORAGE_BUCKET = 'qwips'
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY')
-
-print("\n--- Supabase Key Check ---")
-print(f"URL loaded: {SUPABASE_URL}")
-print(f"Key loaded: {SUPABASE_ANON_KEY[:5] + '...' if SUPABASE_ANON_KEY else 'None'}")
-print("--------------------------\n")
-
-supabase = None
-from django.conf import settings
-try:
-    if SUPABASE_URL and SUPABASE_ANON_KEY:
-        print("Attempting to initialize Supabase client...")
-        _initialized_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        supabase = _initialized_client
-        settings.supabase = supabase
-        print("Supabase client initialized and attached to settings.")
-    else:
-        print("Supabase URL or ANON KEY missing. Cannot initialize client.")
-except Exception as e:
-    import traceback
-    print("\n!!!!!!!!!!!!!! SUPABASE CLIENT INIT FAILED !!!!!!!!!!!!!!")
-    print(f"EXCEPTION TYPE: {type(e).__name__}")
-    print(f"MESSAGE: {e}")
-    traceback.print_exc()
-    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
-    supabase = None
-    settings.supabase = None
-print(f"settings.supabase is {'set' if getattr(settings, 'supabase', None) else 'NOT set'}")
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+MEDIA_URL = 'media/'
+# Absolute URL LocalStorage files are served from (post media URLs must be absolute).
+LOCAL_STORAGE_BASE_URL = os.getenv('LOCAL_STORAGE_BASE_URL', 'http://localhost:8000/media/')
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # request.user from token claims; no User query per request
+        'users.authentication.ClaimsJWTAuthentication',
+    ),
+    # Same bytes as DRF's JSONRenderer, encoded with orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 
@@ -107,7 +88,78 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_BLACKLIST_ENABLED": True,
+    # Refresh/logout with users.tokens.RefreshToken: in-memory blacklist pre-check, no user query
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.serializers.TokenBlacklistSerializer",
 }
+# Longest a process goes without picking up refresh tokens blacklisted elsewhere (users.tokens);
+# with a shared CACHE_URL they are picked up on the next refresh
+TOKEN_BLACKLIST_SYNC_INTERVAL = 30
+
+# Home timelines: fan-out on write, merged at read time above the follower limit
+TIMELINE_BACKEND = 'posts.timeline.DatabaseTimelineBackend'
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BACKFILL_LIMIT = 200
+
+# Resumable uploads: chunks are staged here until the upload completes
+UPLOAD_STAGING_BACKEND = 'posts.uploads.LocalChunkStore'
+UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR')  # None: <system temp dir>/qwik-uploads
+UPLOAD_SESSION_MAX_SIZE = 500 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+# Uploaded files are SHA-256 hashed as they stream in, for media deduplication
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.HashingMemoryFileUploadHandler',
+    'posts.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
+# Celery (background media processing); set CELERY_TASK_ALWAYS_EAGER=True to run tasks inline in development
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER') == 'True'
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Media processing: downscaled widths generated for image posts
+MEDIA_RENDITION_WIDTHS = (320, 640, 1080)
+# Media processing: largest original a worker downloads (bigger ones are marked failed)
+MEDIA_PROCESSING_MAX_BYTES = UPLOAD_SESSION_MAX_SIZE
+
+# Trending: engagement decays by half every TRENDING_HALF_LIFE
+TRENDING_HALF_LIFE = timedelta(hours=6)
+
+# Cache for post/profile detail payloads (api.cache); per-process locmem unless CACHE_URL points at Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL'),
+    } if os.getenv('CACHE_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+DETAIL_CACHE_TIMEOUT = 300
+
+# How long each process trusts a user's cached is_active/auth_version (users.authentication);
+# deactivation locks out existing tokens within this many seconds
+AUTH_USER_STATE_TTL = 30
+
+# Async login (users.views.LoginView): password hashes run on at most LOGIN_HASH_WORKERS threads with
+# LOGIN_HASH_QUEUE more waiting; beyond that logins get 503 instead of piling up on the workers
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+LOGIN_HASH_QUEUE = 32
+# Token buckets per client IP, and for failed attempts per email and IP and per email
+# (users.throttling): (burst capacity, seconds to refill it)
+LOGIN_THROTTLE_RATES = {
+    'ip': (20, 60),
+    'email_ip': (5, 300),
+    'email': (50, 3600),
+}
+
+# Per-process cache of each user's following ids (users.graph), evicted LRU above this size
+SOCIAL_GRAPH_CACHE_BYTES = 32 * 1024 * 1024
+# Longest a process serves follow lists without seeing changes made elsewhere (users.graph);
+# with a shared CACHE_URL changes are seen on the next lookup, so this is only a backstop
+SOCIAL_GRAPH_CACHE_TTL = 300 if os.getenv('CACHE_URL') else 5
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -154,6 +206,8 @@ DATABASES = {
 }
 
 AUTH_USER_MODEL = 'users.User'
+# Email login; unknown emails still cost one hash so timing doesn't reveal accounts
+AUTHENTICATION_BACKENDS = ['users.backend.EmailBackend']
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
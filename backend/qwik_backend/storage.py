@@ -0,0 +1,161 @@
+"""
+Object storage for user media.
+
+The backend is chosen with the STORAGE_BACKEND setting and created on first
+use, so importing settings (manage.py commands, tests, worker boot) never
+touches the network:
+
+- SupabaseStorage talks to the Supabase Storage REST API through one shared
+  httpx.Client, so uploads reuse keep-alive connections.
+- LocalStorage writes to MEDIA_ROOT, for tests and offline development.
+"""
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'qwik_backend.storage.SupabaseStorage'
+CHUNK_SIZE = 1024 * 1024
+
+
+class StorageUnavailable(Exception):
+    pass
+
+
+class StorageError(Exception):
+    pass
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE):
+    # UploadedFile.chunks() yields in-memory uploads in one piece; read fixed-size blocks instead
+    file.seek(0)
+    while chunk := file.read(chunk_size):
+        yield chunk
+
+
+class BaseStorage:
+    def upload(self, key, file, content_type):
+        """Store a file-like object under `key`, streaming it in chunks; returns its public URL."""
+        raise NotImplementedError
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+    def public_url(self, key):
+        raise NotImplementedError
+
+    def create_signed_upload(self, key):
+        """Pre-signed upload for `key`: {'upload_url', 'token'}."""
+        raise StorageUnavailable('Direct uploads are not supported by this storage backend')
+
+
+class SupabaseStorage(BaseStorage):
+    def __init__(self, transport=None):
+        self.url = settings.SUPABASE_URL
+        self.key = settings.SUPABASE_ANON_KEY
+        self.bucket = settings.STORAGE_BUCKET
+        self._transport = transport
+        self._lock = threading.Lock()
+
+    @cached_property
+    def http(self):
+        if not self.url or not self.key:
+            raise StorageUnavailable('Supabase service unavailable (Configuration check needed)')
+        with self._lock:
+            return httpx.Client(
+                base_url=f"{self.url}/storage/v1",
+                headers={'Authorization': f'Bearer {self.key}', 'apikey': self.key},
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                timeout=httpx.Timeout(10.0, write=60.0),
+                transport=self._transport,
+            )
+
+    def _request(self, method, path, **kwargs):
+        try:
+            response = self.http.request(method, path, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise StorageError(str(e)) from e
+        return response
+
+    def upload(self, key, file, content_type):
+        self._request(
+            'POST', f"/object/{self.bucket}/{key}",
+            content=iter_chunks(file),
+            headers={'Content-Type': content_type, 'Content-Length': str(file.size), 'x-upsert': 'true'},
+        )
+        return self.public_url(key)
+
+    def delete(self, keys):
+        if keys:
+            self._request('DELETE', f"/object/{self.bucket}", json={'prefixes': list(keys)})
+
+    def public_url(self, key):
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{key}"
+
+    def create_signed_upload(self, key):
+        path = self._request('POST', f"/object/upload/sign/{self.bucket}/{key}").json()['url']
+        token = parse_qs(urlparse(path).query).get('token')
+        if not token:
+            raise StorageError('No token sent by the storage API')
+        return {'upload_url': f"{self.url}/storage/v1{path}", 'token': token[0]}
+
+
+class LocalStorage(BaseStorage):
+    def __init__(self):
+        self.root = Path(settings.MEDIA_ROOT)
+        self.base_url = settings.LOCAL_STORAGE_BASE_URL.rstrip('/')
+
+    def _path(self, key):
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise StorageError(f'Invalid key: {key}')
+        return path
+
+    def upload(self, key, file, content_type):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as out:
+            for chunk in iter_chunks(file):
+                out.write(chunk)
+        return self.public_url(key)
+
+    def delete(self, keys):
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+
+    def public_url(self, key):
+        return f"{self.base_url}/{key}"
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = import_string(getattr(settings, 'STORAGE_BACKEND', DEFAULT_BACKEND))()
+    return _storage
+
+
+def is_stored_url(url):
+    """True for public URLs of objects in the configured storage, and for nothing on other hosts."""
+    prefix = get_storage().public_url('')
+    return bool(url) and url.startswith(prefix) and '..' not in url[len(prefix):]
+
+
+@receiver(setting_changed)
+def _reset_storage(*, setting, **kwargs):
+    global _storage
+    if setting in ('STORAGE_BACKEND', 'STORAGE_BUCKET', 'SUPABASE_URL', 'SUPABASE_ANON_KEY',
+                   'MEDIA_ROOT', 'LOCAL_STORAGE_BASE_URL'):
+        _storage = None
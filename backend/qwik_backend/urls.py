@@ -15,6 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -22,3 +24,6 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include('api.urls')),
 ]
+
+# Files written by LocalStorage (only served with DEBUG on)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,42 @@
+"""
+Maintenance of the precomputed Audience table.
+
+A row (owner, viewer) exists while the viewer is the owner's friend (they
+follow each other) and/or in the owner's close circle. Rows are upserted with
+a single INSERT ... ON CONFLICT and dropped once neither flag is set. Post
+visibility (PostQuerySet.visible_to) is a semi-join on this table.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .models import Audience
+
+
+def _set_flag(pairs, flag, value):
+    if value:
+        Audience.objects.bulk_create(
+            [Audience(owner_id=owner_id, viewer_id=viewer_id, **{flag: True}) for owner_id, viewer_id in pairs],
+            update_conflicts=True, unique_fields=['owner', 'viewer'], update_fields=[flag],
+        )
+        return
+    rows = Audience.objects.filter(reduce(or_, (Q(owner_id=o, viewer_id=v) for o, v in pairs)))
+    rows.update(**{flag: False})
+    rows.filter(is_friend=False, is_close=False).delete()
+
+
+def set_friends(user_id, other_id, value):
+    """Friendship is symmetric: each sees the other's friends-only posts."""
+    _set_flag([(user_id, other_id), (other_id, user_id)], 'is_friend', value)
+
+
+def add_friends(user_id, other_ids):
+    """set_friends(user_id, other, True) for many others in one statement."""
+    pairs = [pair for other_id in other_ids for pair in ((user_id, other_id), (other_id, user_id))]
+    if pairs:
+        _set_flag(pairs, 'is_friend', True)
+
+
+def set_close(owner_id, member_id, value):
+    _set_flag([(owner_id, member_id)], 'is_close', value)
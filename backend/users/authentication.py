@@ -0,0 +1,114 @@
+"""
+JWT authentication without a User query per request.
+
+JWTAuthentication loads the user's row before every view. Tokens from
+users.tokens already carry role, is_verified and auth_version, so here
+request.user is a User built from those claims. The rest of the row loads in
+one query the first time a view reads another field.
+
+The row still decides who may use a token: each user's (is_active,
+auth_version) is cached per process for AUTH_USER_STATE_TTL seconds.
+Deactivating a user or calling User.revoke_tokens() bumps auth_version and
+locks out existing tokens within that window (at once in the process that
+made the change). Tokens without a version claim are checked the usual way.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import VERSION_CLAIM
+
+DEFAULT_TTL = 30
+MAX_ENTRIES = 100_000
+# Token claim -> User field; everything else is deferred
+CLAIM_FIELDS = {'role': 'role', 'is_verified': 'is_verified', VERSION_CLAIM: 'auth_version'}
+
+
+class UserStateCache:
+    """user_id -> (is_active, auth_version), each entry trusted for `ttl` seconds."""
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (expires, state)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, user_id):
+        """The user's state, or None if there is no such user."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        state = User.objects.filter(pk=user_id).values_list('is_active', 'auth_version').first()
+        if state is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, state)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return state
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_states = None
+_states_lock = threading.Lock()
+
+
+def get_user_states():
+    global _states
+    if _states is None:
+        with _states_lock:
+            if _states is None:
+                _states = UserStateCache(getattr(settings, 'AUTH_USER_STATE_TTL', DEFAULT_TTL))
+    return _states
+
+
+@receiver(setting_changed)
+def _reset_states(*, setting, **kwargs):
+    global _states
+    if setting == 'AUTH_USER_STATE_TTL':
+        _states = None
+
+
+def user_from_claims(user_id, token):
+    """A User with id and the claim fields loaded; other fields are deferred."""
+    known = {'id': user_id, **{field: token[claim] for claim, field in CLAIM_FIELDS.items()}, 'is_active': True}
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in known]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [known[name] for name in names])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in CLAIM_FIELDS):
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        state = get_user_states().get(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, auth_version = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token[VERSION_CLAIM] != auth_version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return user_from_claims(user_id, validated_token)
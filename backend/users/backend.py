@@ -1,12 +1,43 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from . import hashing
+
 class EmailBackend(ModelBackend):
+    """
+    Email + password login. Unknown emails still pay for one hash, so response
+    time doesn't reveal which emails have accounts. The async variant hashes on
+    the bounded pool in users.hashing; it raises HashingPoolFull when that is
+    saturated.
+    """
     def authenticate(self, request, email=None, password=None, **kwargs):
         UserModel = get_user_model()
+        email = email or kwargs.get('username')  # the admin login form passes `username`
+        if email is None or password is None:
+            return None
         try:
             user = UserModel.objects.get(email=email)
-            if user.check_password(password):
-                return user
         except UserModel.DoesNotExist:
-            return None
\ No newline at end of file
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password):
+            return user
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        email = email or kwargs.get('username')
+        if email is None or password is None:
+            return None
+        try:
+            user = await UserModel.objects.aget(email=email)
+        except UserModel.DoesNotExist:
+            await hashing.ahash(password)
+            return None
+        is_correct, must_update = await hashing.averify(password, user.password)
+        if not is_correct:
+            return None
+        if must_update:
+            # Stronger hasher or higher work factor configured since this password was set
+            user.password = await hashing.ahash(password)
+            await user.asave(update_fields=['password'])
+        return user
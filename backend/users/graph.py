@@ -0,0 +1,145 @@
+"""
+In-process cache of who each user follows.
+
+Each user's following ids are kept as a sorted array('i') (4 bytes per id),
+so membership is a bisect and a user following 5,000 accounts costs about
+20 KB. Entries are loaded on first use and evicted least-recently-used once
+the cache holds more than SOCIAL_GRAPH_CACHE_BYTES.
+
+Follow save/delete drop the local entry and bump a version in the shared
+cache (api.cache). Entries remember the version they were loaded at, so with
+a shared CACHE_URL other processes notice the change on their next lookup.
+The default locmem cache is per process, so entries are also reloaded once
+they are older than SOCIAL_GRAPH_CACHE_TTL seconds.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from api import cache as shared_cache
+from .models import Follow
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL = 5
+# Rough per-entry cost beyond the ids themselves (array header, dict slot, key, version, load time)
+ENTRY_OVERHEAD = 200
+
+
+class FollowingCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (version, loaded_at, array)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _size(ids):
+        return ENTRY_OVERHEAD + ids.itemsize * len(ids)
+
+    def following(self, user_id):
+        """Sorted array of the ids `user_id` follows."""
+        version = shared_cache.versions([('following', user_id)])[0]
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        ids = array('i', Follow.objects.filter(follower_id=user_id).order_by('following_id')
+                    .values_list('following_id', flat=True))
+        with self._lock:
+            self._discard(user_id)
+            self._entries[user_id] = (version, now, ids)
+            self._bytes += self._size(ids)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted, (_, _, evicted_ids) = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted_ids)
+                self.evictions += 1
+        return ids
+
+    def is_following(self, follower_id, following_id):
+        ids = self.following(follower_id)
+        i = bisect_left(ids, following_id)
+        return i < len(ids) and ids[i] == following_id
+
+    def followed_among(self, follower_id, user_ids):
+        """The subset of `user_ids` that `follower_id` follows, with one version check for the batch."""
+        ids = self.following(follower_id)
+        followed = set()
+        for user_id in user_ids:
+            i = bisect_left(ids, user_id)
+            if i < len(ids) and ids[i] == user_id:
+                followed.add(user_id)
+        return followed
+
+    def invalidate(self, user_id):
+        shared_cache.bump('following', user_id)
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[2])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_following_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FollowingCache(
+                    getattr(settings, 'SOCIAL_GRAPH_CACHE_BYTES', DEFAULT_MAX_BYTES),
+                    getattr(settings, 'SOCIAL_GRAPH_CACHE_TTL', DEFAULT_TTL),
+                )
+    return _cache
+
+
+def following_ids(user_id):
+    return get_following_cache().following(user_id)
+
+
+def is_following(follower_id, following_id):
+    return get_following_cache().is_following(follower_id, following_id)
+
+
+def followed_among(follower_id, user_ids):
+    return get_following_cache().followed_among(follower_id, user_ids)
+
+
+def stats():
+    return get_following_cache().stats()
+
+
+@receiver(setting_changed)
+def _reset_cache(*, setting, **kwargs):
+    global _cache
+    if setting in ('SOCIAL_GRAPH_CACHE_BYTES', 'SOCIAL_GRAPH_CACHE_TTL'):
+        _cache = None
@@ -0,0 +1,81 @@
+"""
+Bounded pool for password hashing on the async login path.
+
+PBKDF2 is deliberately slow. Run on the request thread (or on the event
+loop, as Django's acheck_password does), a burst of logins ties up every
+worker and starves the rest of the API. Here hashing runs on at most
+LOGIN_HASH_WORKERS threads, and hashlib releases the GIL while it works.
+At most LOGIN_HASH_QUEUE more hashes may wait their turn. Past that, run()
+raises HashingPoolFull immediately so the view can shed the request
+instead of queueing it.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE = 32
+
+
+class HashingPoolFull(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE):
+        self.workers = workers
+        self.queue = queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingPoolFull
+        # The slot is freed when the hash finishes, even if the awaiting request has gone away
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    getattr(settings, 'LOGIN_HASH_WORKERS', DEFAULT_WORKERS),
+                    getattr(settings, 'LOGIN_HASH_QUEUE', DEFAULT_QUEUE),
+                )
+    return _pool
+
+
+@receiver(setting_changed)
+def _reset_pool(*, setting, **kwargs):
+    global _pool
+    if setting in ('LOGIN_HASH_WORKERS', 'LOGIN_HASH_QUEUE') and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+async def averify(password, encoded):
+    """(is_correct, must_update) for `password` against the stored hash, computed on the pool."""
+    return await get_hashing_pool().run(verify_password, password, encoded)
+
+
+async def ahash(password):
+    return await get_hashing_pool().run(make_password, password)
@@ -0,0 +1,103 @@
+import logging
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from posts.models import Post
+from users.hashing import get_hashing_pool
+from users.tokens import RefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure feed latency while other threads hammer the login endpoint (unknown emails from many IPs, "
+        "so only the hashing pool stands in their way), with the pool bounded as configured and unbounded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--storm-threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Feed requests per phase')
+        parser.add_argument('--posts', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # The storm threads use their own connections, so fixtures are committed and deleted afterwards
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        reader = User.objects.create_user(email=f'storm-{tag}@example.invalid', username=f'storm-{tag}', password=None)
+        request_log = logging.getLogger('django.request')
+        level = request_log.level
+        request_log.setLevel(logging.ERROR)  # not a warning per failed login
+        try:
+            Post.objects.bulk_create(
+                Post(user=reader, caption=f'storm {i}', post_type='permanent') for i in range(options['posts'])
+            )
+            access = str(RefreshToken.for_user(reader).access_token)
+            feed = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {access}')
+            # Throttles are out of the picture: every attempt has a fresh IP and email
+            with override_settings(LOGIN_THROTTLE_RATES={}):
+                baseline = self._feed_latencies(feed, options['requests'])
+                self.stdout.write(self._row('feed alone', baseline))
+                for label, overrides in (
+                    ('storm, bounded pool', {}),
+                    ('storm, unbounded', {'LOGIN_HASH_WORKERS': options['storm_threads'], 'LOGIN_HASH_QUEUE': 0}),
+                ):
+                    with override_settings(**overrides):
+                        latencies, outcomes = self._storm(feed, options['storm_threads'], options['requests'])
+                        pool = get_hashing_pool()
+                    self.stdout.write(self._row(label, latencies) + f"  hash workers {pool.workers}, logins {dict(outcomes)}")
+        finally:
+            request_log.setLevel(level)
+            reader.delete()
+
+    @staticmethod
+    def _feed_latencies(client, requests):
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get('/api/posts/posts/')
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        return latencies
+
+    def _storm(self, feed, threads, requests):
+        stop = threading.Event()
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def attack(n):
+            client = Client(HTTP_HOST='localhost')
+            i = 0
+            while not stop.is_set():
+                i += 1
+                response = client.post(
+                    '/api/users/login/', {'email': f'nobody-{n}-{i}@example.invalid', 'password': 'hunter2'},
+                    content_type='application/json', REMOTE_ADDR=f'10.{n}.{i // 250 % 250}.{i % 250}',
+                )
+                with lock:
+                    outcomes[response.status_code] += 1
+            connection.close()
+
+        workers = [threading.Thread(target=attack, args=(n,)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        time.sleep(0.5)  # let the storm build up
+        try:
+            latencies = self._feed_latencies(feed, requests)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        return latencies, outcomes
+
+    @staticmethod
+    def _row(label, latencies):
+        quantiles = statistics.quantiles(latencies, n=100)
+        return f"{label:<22}p50 {quantiles[49]:7.1f} ms  p95 {quantiles[94]:7.1f} ms  p99 {quantiles[98]:7.1f} ms"
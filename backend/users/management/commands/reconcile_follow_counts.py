@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api import cache as detail_cache
+from users.models import User, Follow
+
+
+class Command(BaseCommand):
+    help = "Repair drift in User.followers_count / following_count, one id range at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, checked, repaired = 0, 0, 0
+        while True:
+            # Follows bump both users' counters in their own transaction, so with the batch locked,
+            # every one is either in the counts below or lands on top of the repaired value
+            with transaction.atomic():
+                users = list(User.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                             .only('id', 'followers_count', 'following_count')[:batch_size])
+                if not users:
+                    break
+                ids = [u.id for u in users]
+                followers = dict(Follow.objects.filter(following_id__in=ids).values('following_id').annotate(n=Count('id')).values_list('following_id', 'n'))
+                following = dict(Follow.objects.filter(follower_id__in=ids).values('follower_id').annotate(n=Count('id')).values_list('follower_id', 'n'))
+                drifted = []
+                for user in users:
+                    actual = (followers.get(user.id, 0), following.get(user.id, 0))
+                    if (user.followers_count, user.following_count) != actual:
+                        user.followers_count, user.following_count = actual
+                        drifted.append(user)
+                # Only drifted rows are written; counters are re-applied as absolute values
+                User.objects.bulk_update(drifted, ['followers_count', 'following_count'])
+            detail_cache.bump('user', *(u.id for u in drifted))
+            checked += len(users)
+            repaired += len(drifted)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, repaired {repaired}"))
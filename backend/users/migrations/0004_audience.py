@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_user_follow_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Audience",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("is_friend", models.BooleanField(default=False)),
+                ("is_close", models.BooleanField(default=False)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="audience",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "viewer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="audience_of",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["viewer", "owner"],
+                        include=("is_friend", "is_close"),
+                        name="audience_viewer_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "viewer"), name="audience_owner_viewer_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="CloseCircleMember",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="close_circle_of",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="close_circle",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("owner", "member")},
+            },
+        ),
+        # Existing mutual follows are friends
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO users_audience (owner_id, viewer_id, is_friend, is_close)
+                SELECT f.following_id, f.follower_id, true, false
+                FROM users_follow f
+                JOIN users_follow back
+                  ON back.follower_id = f.following_id AND back.following_id = f.follower_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
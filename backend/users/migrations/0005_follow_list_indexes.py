@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_audience"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["following", "-created_at", "-id"],
+                name="follow_followers_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["follower", "-created_at", "-id"],
+                name="follow_following_recent_idx",
+            ),
+        ),
+    ]
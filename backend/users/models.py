@@ -20,6 +20,11 @@ class User(AbstractUser):
     )
     is_active = models.BooleanField(default=True)
     is_verified = models.BooleanField(default=False, help_text="Verified badge")
+    # Maintained by the Follow signals (users.signals); repaired by reconcile_follow_counts
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Carried in tokens as the 'ver' claim (users.tokens); bumping it revokes every token issued so far
+    auth_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -32,6 +37,18 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Users built from token claims (users.authentication) load the rest of their row in one query
+        deferred = self.get_deferred_fields()
+        if fields and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using, fields, **kwargs)
+
+    def revoke_tokens(self):
+        User.objects.filter(pk=self.pk).update(auth_version=models.F('auth_version') + 1)
+        # A later save() of this instance must not write the old version back
+        self.refresh_from_db(fields=['auth_version'])
+
 class Follow(models.Model):
     """
     Tracks follows for social graph (e.g., personal feed in posts).
@@ -43,7 +60,48 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')
-        indexes = [models.Index(fields=['follower', 'following'])]
+        indexes = [
+            models.Index(fields=['follower', 'following']),
+            # Follower/following lists: newest first, keyset on (created_at, id)
+            models.Index(fields=['following', '-created_at', '-id'], name='follow_followers_recent_idx'),
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_following_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.following.username}"
+class CloseCircleMember(models.Model):
+    """
+    A user the owner shares 'close circle' posts with.
+    """
+    id = models.AutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='close_circle')
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='close_circle_of')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('owner', 'member')
+
+    def __str__(self):
+        return f"{self.member.username} is in {self.owner.username}'s close circle"
+
+class Audience(models.Model):
+    """
+    Precomputed audience of each owner's restricted posts: one row per (owner, viewer)
+    pair that is friends (mutual follow) or close circle. Maintained by users.signals,
+    so post visibility is an indexed semi-join instead of a per-row permission check.
+    """
+    id = models.BigAutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='audience')
+    viewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='audience_of')
+    is_friend = models.BooleanField(default=False)
+    is_close = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['owner', 'viewer'], name='audience_owner_viewer_unique')]
+        indexes = [
+            # "Whose restricted posts may this viewer see?" is answered from the index alone
+            models.Index(fields=['viewer', 'owner'], include=['is_friend', 'is_close'], name='audience_viewer_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.follower.username} follows {self.following.username}"
\ No newline at end of file
+        return f"{self.viewer_id} in audience of {self.owner_id}"
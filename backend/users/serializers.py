@@ -1,7 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from api.lean import LeanSerializer
 from .models import User, Follow
+from .authentication import get_user_states
+from .tokens import RefreshToken, VERSION_CLAIM
 
 class RegisterSerializer(serializers.ModelSerializer):
     """
@@ -29,13 +35,9 @@ class RegisterSerializer(serializers.ModelSerializer):
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
     Custom JWT serializer - adds user details to token response.
+    The token itself carries role, is_verified and auth_version (users.tokens).
     """
-    @classmethod
-    def get_token(cls, user):
-        token = super().get_token(user)
-        token['role'] = user.role
-        token['is_verified'] = user.is_verified
-        return token
+    token_class = RefreshToken
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -51,6 +53,28 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         })
         return data
 
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Refresh without loading the user: the blacklist is pre-checked in memory
+    (users.tokens) and the user's is_active/auth_version come from the cached
+    state users.authentication keeps.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            return super().validate(attrs)
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        state = get_user_states().get(int(user_id)) if user_id else None
+        if state is None or not state[0] or refresh.payload.get(VERSION_CLAIM, state[1]) != state[1]:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        return {'access': str(refresh.access_token)}
+
+class TokenBlacklistSerializer(jwt_serializers.TokenBlacklistSerializer):
+    """Logout: also adds the token to this process's blacklist index right away."""
+    token_class = RefreshToken
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for user profiles and nested use (e.g., in posts).
@@ -64,6 +88,14 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'email', 'role', 'is_active', 'created_at', 'updated_at']
 
+class LeanUserSerializer(LeanSerializer):
+    """UserSerializer output from values() rows, for hot list endpoints."""
+    serializer_class = UserSerializer
+
+class BulkFollowSerializer(serializers.Serializer):
+    """Contact import: ids of the users to follow."""
+    users = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
 class FollowSerializer(serializers.ModelSerializer):
     """
     Serializer for follow relationships.
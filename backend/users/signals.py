@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from api import cache as detail_cache
+from .audience import set_close, set_friends
+from .authentication import get_user_states
+from .graph import get_following_cache
+from .models import User, Follow, CloseCircleMember
+
+# Sent by users.follows.bulk_follow for the rows its INSERT created
+# (which bypasses post_save). Args: follower_id, following_ids.
+follows_created = Signal()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no payload includes
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    detail_cache.bump('user', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_state_changed(sender, instance, signal, created=False, **kwargs):
+    # Deactivation revokes every token issued so far
+    if signal is post_save and not created and not instance.is_active:
+        instance.revoke_tokens()
+    get_user_states().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_counts(sender, instance, **kwargs):
+    detail_cache.bump('user', instance.follower_id, instance.following_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_following_set(sender, instance, **kwargs):
+    graph = get_following_cache()
+    graph.invalidate(instance.follower_id)
+    # Again once committed: another process may have reloaded the old rows in between
+    transaction.on_commit(lambda: graph.invalidate(instance.follower_id))
+
+
+def _adjust_follow_counts(follow, delta, skip=None):
+    # Both sides in the caller's transaction; `skip` is a user being deleted anyway
+    if follow.following_id != skip:
+        User.objects.filter(pk=follow.following_id).update(followers_count=F('followers_count') + delta)
+    if follow.follower_id != skip:
+        User.objects.filter(pk=follow.follower_id).update(following_count=F('following_count') + delta)
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        _adjust_follow_counts(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, origin=None, **kwargs):
+    # Deleting a user cascades to their follows: only the other side's counter changes
+    _adjust_follow_counts(instance, -1, skip=origin.pk if isinstance(origin, User) else None)
+
+
+@receiver(post_save, sender=Follow)
+def follow_may_make_friends(sender, instance, created, **kwargs):
+    if created and Follow.objects.filter(follower_id=instance.following_id, following_id=instance.follower_id).exists():
+        set_friends(instance.follower_id, instance.following_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_ends_friendship(sender, instance, origin=None, **kwargs):
+    # A deleted user's Audience rows go with the user
+    if not isinstance(origin, User):
+        set_friends(instance.follower_id, instance.following_id, False)
+
+
+@receiver(post_save, sender=CloseCircleMember)
+def close_circle_added(sender, instance, created, **kwargs):
+    if created:
+        set_close(instance.owner_id, instance.member_id, True)
+
+
+@receiver(post_delete, sender=CloseCircleMember)
+def close_circle_removed(sender, instance, origin=None, **kwargs):
+    if not isinstance(origin, User):
+        set_close(instance.owner_id, instance.member_id, False)
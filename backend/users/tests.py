@@ -4,9 +4,27 @@ from django.test import TestCase
 
 
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import threading
+import time
+from datetime import timedelta
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from io import StringIO
+from unittest import mock
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from .models import User, Follow
+from api import cache as shared_cache
+from api.pagination import KeysetPagination
+from .models import User, Follow, Audience
+from .graph import FollowingCache, ENTRY_OVERHEAD
+from .tokens import BLACKLIST_VERSION, BlacklistIndex
+from .hashing import get_hashing_pool
+from . import hashing
 
 User = get_user_model()
 
@@ -39,4 +57,457 @@ class UserAPITest(APITestCase):
         response = self.client.put('/api/users/me/', data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.user.refresh_from_db()
-        self.assertEqual(self.user.bio, 'Updated bio!')
\ No newline at end of file
+        self.assertEqual(self.user.bio, 'Updated bio!')
+class ProfileCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/users/users/{self.other.pk}/'
+
+    def test_cached_profile_tracks_follows(self):
+        self.assertEqual(self.client.get(self.url).data['followers_count'], 0)
+        with self.assertNumQueries(1):  # is_following only
+            self.client.get(self.url)
+        self.client.post(f'{self.url}follow/')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertTrue(response.data['is_following'])
+        self.assertEqual(self.client.get('/api/users/me/').data['following_count'], 1)
+
+    def test_profile_changed_elsewhere_is_rebuilt(self):
+        first = self.client.get(self.url)
+        # A write in another process: the row moves on, this process's cache version doesn't
+        User.objects.filter(pk=self.other.pk).update(bio='changed', updated_at=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bio'], 'changed')
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(bio='mine', updated_at=timezone.now())
+        self.assertEqual(self.client.get('/api/users/me/').data['bio'], 'mine')
+
+    def test_profile_revalidation(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.post(f'{self.url}follow/')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_following'])
+
+    def test_profile_edit_invalidates(self):
+        self.client.get('/api/users/me/')
+        self.client.put('/api/users/me/', {'bio': 'new bio'})
+        self.assertEqual(self.client.get('/api/users/me/').data['bio'], 'new bio')
+
+    def test_deactivated_user_is_not_served(self):
+        self.client.get(self.url)
+        self.other.is_active = False
+        self.other.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+class FollowCounterTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.third = User.objects.create_user(email='third@example.com', username='third', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def counts(self, user):
+        user.refresh_from_db()
+        return user.followers_count, user.following_count
+
+    def test_follow_and_unfollow(self):
+        self.client.post(f'/api/users/users/{self.other.pk}/follow/')
+        self.client.post(f'/api/users/users/{self.other.pk}/follow/')  # already following: no change
+        self.assertEqual((self.counts(self.user), self.counts(self.other)), ((0, 1), (1, 0)))
+        self.client.delete(f'/api/users/users/{self.other.pk}/follow/')
+        self.assertEqual((self.counts(self.user), self.counts(self.other)), ((0, 0), (0, 0)))
+
+    def test_user_deletion_updates_the_other_side(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        Follow.objects.create(follower=self.other, following=self.third)
+        self.other.delete()
+        self.assertEqual((self.counts(self.user), self.counts(self.third)), ((0, 0), (0, 0)))
+
+    def test_profile_reads_counters(self):
+        Follow.objects.create(follower=self.other, following=self.user)
+        with self.assertNumQueries(2):  # its version and, on a cache miss, the user row: no count() queries
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['followers_count'], 1)
+
+    def test_reconcile(self):
+        Follow.objects.create(follower=self.user, following=self.other)
+        User.objects.filter(pk=self.other.pk).update(followers_count=5)
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('reconcile_follow_counts', batch_size=2, stdout=out)
+        self.assertIn('Checked 3 users, repaired 1', out.getvalue())
+        # Each batch is counted and written under a lock, so a concurrent follow can't be overwritten
+        self.assertEqual(sum('FOR UPDATE' in q['sql'] for q in queries), 3)
+        self.assertEqual(self.counts(self.other), (1, 0))
+
+class FollowingCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', username=f'u{i}', password='testpass123') for i in range(4)
+        ]
+        self.a, self.b, self.c, self.d = self.users
+        Follow.objects.create(follower=self.a, following=self.c)
+        Follow.objects.create(follower=self.a, following=self.b)
+
+    def test_sorted_membership_and_hits(self):
+        graph = FollowingCache()
+        self.assertEqual(list(graph.following(self.a.pk)), sorted([self.b.pk, self.c.pk]))
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.a.pk, self.b.pk))
+            self.assertFalse(graph.is_following(self.a.pk, self.d.pk))
+        self.assertEqual((graph.stats()['hits'], graph.stats()['misses']), (2, 1))
+        self.assertAlmostEqual(graph.stats()['hit_rate'], 2 / 3)
+
+    def test_follow_changes_reach_other_processes(self):
+        # A second instance stands in for another worker process sharing the cache backend
+        local, other = FollowingCache(), FollowingCache()
+        self.assertFalse(other.is_following(self.a.pk, self.d.pk))
+        Follow.objects.create(follower=self.a, following=self.d)
+        self.assertTrue(other.is_following(self.a.pk, self.d.pk))
+        Follow.objects.filter(follower=self.a, following=self.b).delete()
+        self.assertEqual(list(local.following(self.a.pk)), sorted([self.c.pk, self.d.pk]))
+
+    def test_entries_expire_without_a_shared_version(self):
+        graph = FollowingCache(ttl=5)
+        with mock.patch('users.graph.time.monotonic', return_value=100.0):
+            graph.following(self.a.pk)
+        # No signal, so no version bump: like a follow made by a process with its own locmem cache
+        Follow.objects.bulk_create([Follow(follower=self.a, following=self.d)])
+        with mock.patch('users.graph.time.monotonic', return_value=104.0):
+            self.assertFalse(graph.is_following(self.a.pk, self.d.pk))
+        with mock.patch('users.graph.time.monotonic', return_value=105.0):
+            self.assertTrue(graph.is_following(self.a.pk, self.d.pk))
+
+    def test_lru_eviction_by_size(self):
+        graph = FollowingCache(max_bytes=2 * ENTRY_OVERHEAD + 8)
+        for user in (self.a, self.b, self.c):
+            graph.following(user.pk)
+        graph.following(self.b.pk)
+        stats = graph.stats()
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+        self.assertEqual(stats['hits'], 1)  # a was evicted, b survived
+
+    @override_settings(SOCIAL_GRAPH_CACHE_BYTES=1024)
+    def test_profile_uses_graph(self):
+        self.client.force_authenticate(user=self.a)
+        self.client.get(f'/api/users/users/{self.b.pk}/')
+        with self.assertNumQueries(1):  # the ETag row only
+            response = self.client.get(f'/api/users/users/{self.b.pk}/')
+        self.assertTrue(response.data['is_following'])
+
+class CloseCircleTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_add_list_and_remove(self):
+        response = self.client.post('/api/users/me/close-circle/', {'user': self.other.pk})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post('/api/users/me/close-circle/', {'user': self.other.pk}).status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual([u['id'] for u in self.client.get('/api/users/me/close-circle/').data], [self.other.pk])
+        self.assertTrue(Audience.objects.filter(owner=self.user, viewer=self.other, is_close=True).exists())
+        response = self.client.delete(f'/api/users/me/close-circle/{self.other.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/users/me/close-circle/').data, [])
+        self.assertFalse(Audience.objects.exists())
+
+    def test_validation(self):
+        self.assertEqual(self.client.post('/api/users/me/close-circle/', {'user': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/api/users/me/close-circle/', {'user': self.user.pk}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/api/users/me/close-circle/', {'user': 999999}).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+class FollowListTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.others = [
+            User.objects.create_user(email=f'f{i}@example.com', username=f'f{i}', password='testpass123') for i in range(5)
+        ]
+        for other in self.others:
+            Follow.objects.create(follower=other, following=self.user)
+        Follow.objects.create(follower=self.user, following=self.others[0])
+        self.client.force_authenticate(user=self.user)
+
+    def test_followers_pages_newest_first(self):
+        url = f'/api/users/users/{self.user.pk}/followers/'
+        with mock.patch.object(KeysetPagination, 'page_size', 3):
+            first = self.client.get(url).data
+            second = self.client.get(url, {'cursor': first['next']}).data
+        self.assertIsNone(second['next'])
+        ids = [u['id'] for u in first['results'] + second['results']]
+        self.assertEqual(ids, [u.pk for u in reversed(self.others)])
+        row = second['results'][-1]
+        self.assertEqual(row['username'], 'f0')
+        self.assertIn('followed_at', row)
+        self.assertEqual([u['is_following'] for u in first['results'] + second['results']], [False] * 4 + [True])
+
+    def test_following_list_and_query_count(self):
+        url = f'/api/users/users/{self.others[0].pk}/following/'
+        self.client.get(url)
+        with self.assertNumQueries(2):  # the user check and the page; is_following comes from the graph cache
+            response = self.client.get(url)
+        self.assertEqual([u['id'] for u in response.data['results']], [self.user.pk])
+        self.assertEqual(self.client.get('/api/users/users/999999/following/').status_code, status.HTTP_404_NOT_FOUND)
+
+class BulkFollowTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.others = [
+            User.objects.create_user(email=f'b{i}@example.com', username=f'b{i}', password='testpass123') for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/users/users/follow/bulk/'
+
+    def test_bulk_follow_is_idempotent(self):
+        a, b, c = self.others
+        Follow.objects.create(follower=self.user, following=a)
+        Follow.objects.create(follower=c, following=self.user)
+        inactive = User.objects.create_user(email='gone@example.com', username='gone', password='x', is_active=False)
+        ids = [a.pk, b.pk, c.pk, b.pk, inactive.pk, 999999]
+        response = self.client.post(self.url, {'users': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {
+            'followed': [b.pk, c.pk], 'already_following': [a.pk], 'missing': [inactive.pk, 999999],
+        })
+        response = self.client.post(self.url, {'users': ids}, format='json')
+        self.assertEqual((response.status_code, response.data['followed']), (status.HTTP_200_OK, []))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 3)
+        self.assertEqual([User.objects.get(pk=u.pk).followers_count for u in self.others], [1, 1, 1])
+        # c followed back, so they are now friends; the graph cache saw the new follows
+        self.assertEqual(set(Audience.objects.filter(is_friend=True).values_list('owner', 'viewer')),
+                         {(self.user.pk, c.pk), (c.pk, self.user.pk)})
+        self.assertTrue(self.client.get(f'/api/users/users/{b.pk}/').data['is_following'])
+        self.assertEqual(self.client.get('/api/users/me/').data['following_count'], 3)
+
+    def test_validation(self):
+        self.assertEqual(self.client.post(self.url, {'users': []}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'users': ['x']}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'users': list(range(1, 202))}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+class ConcurrentUnfollowTest(TransactionTestCase):
+    def test_counts_drop_once(self):
+        user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        Follow.objects.create(follower=user, following=other)
+        Follow.objects.create(follower=other, following=user)
+        barrier = threading.Barrier(4)
+        statuses = []
+
+        def unfollow():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            barrier.wait()
+            statuses.append(client.delete(f'/api/users/users/{other.pk}/follow/').status_code)
+            connection.close()
+
+        threads = [threading.Thread(target=unfollow) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(statuses), [204, 404, 404, 404])
+        user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((user.following_count, user.followers_count), (0, 1))
+        self.assertEqual((other.following_count, other.followers_count), (1, 0))
+
+@override_settings(AUTH_USER_STATE_TTL=60)
+class ClaimsAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        access = self.client.post('/api/users/login/', {'email': 'test@example.com', 'password': 'testpass123'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.url = f'/api/users/users/{self.other.pk}/'
+
+    def test_no_user_query_per_request(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # the ETag row only: request.user comes from the token
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivation_and_revocation(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        # Reactivating does not bring old tokens back
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        access = self.client.post('/api/users/login/', {'email': 'test@example.com', 'password': 'testpass123'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        User.objects.get(pk=self.user.pk).revoke_tokens()
+        User.objects.get(pk=self.user.pk).save()  # any save drops this process's cached state
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_claims_user_loads_the_rest_lazily(self):
+        response = self.client.put('/api/users/me/', {'bio': 'Lazy'})
+        self.assertEqual((response.data['bio'], response.data['email']), ('Lazy', 'test@example.com'))
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.bio, self.user.username), ('Lazy', 'testuser'))
+        response = self.client.post(f'{self.url}follow/')
+        self.assertEqual(response.data['follow']['follower']['username'], 'testuser')
+
+
+@override_settings(AUTH_USER_STATE_TTL=60, TOKEN_BLACKLIST_SYNC_INTERVAL=60)
+class TokenLifecycleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+
+    def login(self):
+        return self.client.post('/api/users/login/', {'email': 'test@example.com', 'password': 'testpass123'}).data
+
+    def test_login_mints_one_pair(self):
+        tokens = self.login()
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/users/me/').status_code, status.HTTP_200_OK)
+
+    def test_refresh_skips_the_tables_until_logout(self):
+        refresh = self.login()['refresh']
+        self.client.post('/api/users/token/refresh/', {'refresh': refresh})
+        with self.assertNumQueries(0):  # blacklist index and user state are warm
+            response = self.client.post('/api/users/token/refresh/', {'refresh': refresh})
+        self.assertIn('access', response.data)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.post('/api/users/logout/', {'refresh': refresh}).status_code,
+                         status.HTTP_205_RESET_CONTENT)
+        self.client.credentials()
+        response = self.client.post('/api/users/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklist_index_catches_rows_committed_out_of_order(self):
+        index = BlacklistIndex(sync_interval=60)
+        expires = timezone.now() + timedelta(days=1)
+
+        def blacklist(jti, blacklisted_at=None, **kwargs):
+            token = OutstandingToken.objects.create(user=self.user, jti=jti, token='x', expires_at=expires)
+            row = BlacklistedToken.objects.create(token=token, **kwargs)
+            if blacklisted_at:  # auto_now_add ignores it on create
+                BlacklistedToken.objects.filter(pk=row.pk).update(blacklisted_at=blacklisted_at)
+            return row
+
+        skipped = blacklist('skipped')
+        blacklist('committed-first')
+        skipped.delete()
+        with mock.patch('users.tokens.time.monotonic', return_value=100.0):
+            self.assertTrue(index.may_contain('committed-first'))
+            # A lower id than the rows already seen, committed after them
+            blacklist('committed-late', id=skipped.id)
+            shared_cache.bump(*BLACKLIST_VERSION)
+            self.assertTrue(index.may_contain('committed-late'))
+            # Older than the overlap window: only the next full reload finds it
+            blacklist('very-late', blacklisted_at=timezone.now() - timedelta(hours=1))
+            shared_cache.bump(*BLACKLIST_VERSION)
+            self.assertFalse(index.may_contain('very-late'))
+        with mock.patch('users.tokens.time.monotonic', return_value=160.0):
+            self.assertTrue(index.may_contain('very-late'))
+
+    def test_refresh_honours_deactivation(self):
+        refresh = self.login()['refresh']
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/api/users/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_expired_tokens(self):
+        self.login()
+        past = timezone.now() - timedelta(days=1)
+        for i in range(3):
+            token = OutstandingToken.objects.create(user=self.user, jti=f'old-{i}', token='x', expires_at=past)
+            if i:
+                BlacklistedToken.objects.create(token=token)
+        out = StringIO()
+        call_command('purge_expired_tokens', batch_size=2, stdout=out)
+        self.assertIn('Deleted 2 blacklisted and 3 outstanding tokens', out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+
+@override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_QUEUE=0)
+class LoginThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', username='testuser', password='testpass123')
+
+    def login(self, email='test@example.com', password='testpass123', **extra):
+        return self.client.post('/api/users/login/', {'email': email, 'password': password}, format='json', **extra)
+
+    @override_settings(LOGIN_THROTTLE_RATES={'ip': (100, 60), 'email_ip': (100, 60), 'email': (2, 300)})
+    def test_per_email_bucket(self):
+        # Guesses from many hosts
+        self.assertEqual(self.login(password='wrong', REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login(email='TEST@example.com ', password='wrong', REMOTE_ADDR='10.0.0.2').status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        with mock.patch.object(hashing, 'averify', wraps=hashing.averify) as averify:
+            response = self.login(REMOTE_ADDR='10.0.0.3')  # the right password is refused too, unhashed
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(140 < int(response['Retry-After']) <= 150)  # one token refills in 150s
+        averify.assert_not_called()
+        self.assertEqual(self.login(email='other@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
+        with mock.patch('users.throttling.time.time', return_value=time.time() + 150):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    @override_settings(LOGIN_THROTTLE_RATES={'ip': (100, 60), 'email_ip': (2, 300), 'email': (100, 300)})
+    def test_per_email_and_ip_bucket(self):
+        for _ in range(2):
+            self.assertEqual(self.login(password='wrong', REMOTE_ADDR='10.0.0.9').status_code,
+                             status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.9').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # The guesser's host is blocked, the owner's isn't
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_200_OK)
+
+    @override_settings(LOGIN_THROTTLE_RATES={'ip': (1, 60), 'email': (100, 60)})
+    def test_per_ip_bucket(self):
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+
+    def test_saturated_pool_sheds_logins(self):
+        pool = get_hashing_pool()
+        self.assertTrue(pool._slots.acquire(blocking=False))  # the only slot: one hash in flight
+        try:
+            response = self.login()
+        finally:
+            pool._slots.release()
+        self.assertEqual((response.status_code, response['Retry-After']), (status.HTTP_503_SERVICE_UNAVAILABLE, '1'))
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_unknown_email_still_hashes(self):
+        with mock.patch.object(hashing, 'make_password', wraps=hashing.make_password) as make_password:
+            self.assertEqual(self.login(email='nobody@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
+        make_password.assert_called_once_with('testpass123')
+
+    def test_validation(self):
+        self.assertEqual(self.client.post('/api/users/login/', {'email': 'test@example.com'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/api/users/login/', 'not json', content_type='application/json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,79 @@
+"""
+Token-bucket throttling for login attempts.
+
+Each bucket holds up to `capacity` attempts and refills continuously over
+`period` seconds, so a client can burst to the capacity and then sustain
+capacity / period. State is (tokens, timestamp) in the default cache, shared
+between processes when CACHE_URL points at Redis. The read-modify-write is
+not atomic: concurrent attempts on one key can each spend the same token,
+which only lets a burst overshoot slightly.
+
+LOGIN_THROTTLE_RATES configures the buckets. 'ip' (credential stuffing from
+one host) is spent by every attempt. 'email_ip' (one account guessed from one
+host) and 'email' (one account guessed from many) are spent by failed
+attempts, and once either is empty the account refuses attempts before any
+password is hashed, right or wrong. 'email' is the larger budget, so a
+stranger's guesses only lock the owner out after many failures, and a bad
+password typed on the owner's own device only blocks that device.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'throttle:login'
+DEFAULT_RATES = {
+    'ip': (20, 60),
+    'email_ip': (5, 300),
+    'email': (50, 3600),
+}
+
+
+class TokenBucket:
+    def __init__(self, scope, capacity, period):
+        self.scope = scope
+        self.capacity = capacity
+        self.rate = capacity / period
+
+    def _key(self, ident):
+        return f'{KEY_PREFIX}:{self.scope}:{ident}'
+
+    def _tokens(self, state, now):
+        tokens, stamp = state if state is not None else (self.capacity, now)
+        return min(self.capacity, tokens + (now - stamp) * self.rate)
+
+    def _retry_after(self, tokens):
+        return 0 if tokens >= 1 else math.ceil((1 - tokens) / self.rate)
+
+    def _take(self, state, now):
+        """(new_state, retry_after); retry_after is 0 when a token was taken."""
+        tokens = self._tokens(state, now)
+        if tokens >= 1:
+            return (tokens - 1, now), 0
+        return (tokens, now), self._retry_after(tokens)
+
+    def _timeout(self):
+        # An idle bucket is full again after this long, so its entry can lapse
+        return math.ceil(self.capacity / self.rate) + 1
+
+    async def aconsume(self, ident):
+        """0 if the attempt may go ahead, else the seconds until it may."""
+        key = self._key(ident)
+        state, retry_after = self._take(await cache.aget(key), time.time())
+        await cache.aset(key, state, self._timeout())
+        return retry_after
+
+    async def acheck(self, ident):
+        """Like aconsume, without spending a token."""
+        return self._retry_after(self._tokens(await cache.aget(self._key(ident)), time.time()))
+
+
+def login_buckets():
+    rates = getattr(settings, 'LOGIN_THROTTLE_RATES', DEFAULT_RATES)
+    return {scope: TokenBucket(scope, *rate) for scope, rate in rates.items()}
+
+
+def client_ip(request):
+    # Behind a proxy, configure it to set REMOTE_ADDR (e.g. via the server's forwarded-for handling)
+    return request.META.get('REMOTE_ADDR', '')
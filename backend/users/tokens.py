@@ -0,0 +1,124 @@
+"""
+JWTs carrying what users.authentication needs to build request.user without
+loading the User row: role, is_verified and the user's auth_version. Access
+tokens minted from a refresh token copy its claims.
+
+Refresh tokens check the blacklist against a per-process set of blacklisted,
+unexpired jtis before touching the table. Only tokens in the set (almost
+always ones that really are blacklisted) cost a query. When another process
+blacklists a token, as seen through a shared cache version, the set is topped
+up with rows blacklisted since the last sync (less SYNC_OVERLAP, since rows
+can commit out of order). Every TOKEN_BLACKLIST_SYNC_INTERVAL seconds it is
+reloaded in full, which also catches anything an incremental sync missed and
+is all a per-process cache gets.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from api import cache as shared_cache
+
+VERSION_CLAIM = 'ver'
+DEFAULT_SYNC_INTERVAL = 30
+BLACKLIST_VERSION = ('token_blacklist', 0)
+# How far back an incremental sync looks past the previous one, for rows that committed late
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BlacklistIndex:
+    def __init__(self, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._jtis = {}  # jti -> expires_at
+        self._since = None
+        self._version = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self.checks = self.queries = 0
+
+    def may_contain(self, jti):
+        """False only if `jti` is certainly not blacklisted."""
+        self._sync()
+        with self._lock:
+            self.checks += 1
+            return jti in self._jtis
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._jtis[jti] = expires_at
+        shared_cache.bump(*BLACKLIST_VERSION)
+
+    def _sync(self):
+        version = shared_cache.versions([BLACKLIST_VERSION])[0]
+        now = time.monotonic()
+        with self._lock:
+            full = self._synced_at is None or now - self._synced_at >= self.sync_interval
+            if version == self._version and not full:
+                return
+            since = self._since
+        started = timezone.now()
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=started)
+        if not full:
+            rows = rows.filter(blacklisted_at__gte=since)
+        rows = list(rows.values_list('token__jti', 'token__expires_at'))
+        with self._lock:
+            self.queries += 1
+            if full:
+                # Also drops expired tokens, which fail verification anyway
+                self._jtis = dict(rows)
+                self._synced_at = now
+            else:
+                self._jtis.update(rows)
+            self._version = version
+            self._since = started - SYNC_OVERLAP
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._jtis), 'checks': self.checks, 'queries': self.queries}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_blacklist_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BlacklistIndex(getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
+    return _index
+
+
+@receiver(setting_changed)
+def _reset_index(*, setting, **kwargs):
+    global _index
+    if setting == 'TOKEN_BLACKLIST_SYNC_INTERVAL':
+        _index = None
+
+
+class RefreshToken(tokens.RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['is_verified'] = user.is_verified
+        token[VERSION_CLAIM] = user.auth_version
+        return token
+
+    def check_blacklist(self):
+        if get_blacklist_index().may_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        get_blacklist_index().add(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+        return blacklisted
@@ -1,19 +1,25 @@
 from django.urls import path
 from .views import (
-    RegisterAPIView, LoginAPIView, LogoutAPIView, ProfileAPIView,
-    UserDetailAPIView, FollowAPIView
+    RegisterAPIView, LoginView, LogoutAPIView, ProfileAPIView,
+    UserDetailAPIView, FollowAPIView, FollowersAPIView, FollowingAPIView, BulkFollowAPIView,
+    CloseCircleAPIView, CloseCircleMemberAPIView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     # Auth
     path('register/', RegisterAPIView.as_view(), name='register'),
-    path('login/', LoginAPIView.as_view(), name='login'),
+    path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutAPIView.as_view(), name='logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     # Profiles
     path('me/', ProfileAPIView.as_view(), name='profile-me'),
+    path('me/close-circle/', CloseCircleAPIView.as_view(), name='close-circle'),
+    path('me/close-circle/<int:pk>/', CloseCircleMemberAPIView.as_view(), name='close-circle-member'),
     path('users/<int:pk>/', UserDetailAPIView.as_view(), name='user-detail'),
     path('users/<int:pk>/follow/', FollowAPIView.as_view(), name='user-follow'),
+    path('users/<int:pk>/followers/', FollowersAPIView.as_view(), name='user-followers'),
+    path('users/<int:pk>/following/', FollowingAPIView.as_view(), name='user-following'),
+    path('users/follow/bulk/', BulkFollowAPIView.as_view(), name='user-follow-bulk'),
 ]
\ No newline at end of file
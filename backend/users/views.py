@@ -1,15 +1,77 @@
+import json
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.parsers import JSONParser
 from rest_framework_simplejwt.views import TokenBlacklistView  # Correct import for blacklisting
-from django.contrib.auth import authenticate
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.http import QueryDict
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from .serializers import (
-    RegisterSerializer, CustomTokenObtainPairSerializer, UserSerializer, FollowSerializer
+    RegisterSerializer, UserSerializer, FollowSerializer,
+    BulkFollowSerializer, LeanUserSerializer,
 )
-from .models import User, Follow
+from .models import User, Follow, CloseCircleMember
+from .tokens import RefreshToken
+from .follows import bulk_follow
+from .hashing import HashingPoolFull
+from .throttling import client_ip, login_buckets
+from . import graph
+from api import cache as detail_cache
+from api.etags import conditional_response, make_etag
+from api.lean import format_datetime, format_values
+from api.pagination import KeysetPagination
+from api.renderers import ORJSONRenderer
+
+BULK_FOLLOW_MAX_USERS = 200
+
+# Everything that can change a profile payload (ETag input)
+PROFILE_VERSION_FIELDS = ('updated_at', 'followers_count', 'following_count')
+
+
+def _profile_payload(user):
+    data = UserSerializer(user).data
+    data.update({
+        'followers_count': user.followers_count,
+        'following_count': user.following_count,
+    })
+    return dict(data), [], None
+
+def _cached_profile(users, pk):
+    """
+    The shared profile payload of users[pk], rebuilt when the cached copy is
+    older than the row (another process may have changed it), and its version.
+    """
+    version = format_values(get_object_or_404(users.values_list(*PROFILE_VERSION_FIELDS), pk=pk))
+    payload = detail_cache.get_or_build(
+        'user', pk, lambda: _profile_payload(get_object_or_404(users, pk=pk)),
+        is_current=lambda p: tuple(p[f] for f in PROFILE_VERSION_FIELDS) == version,
+    )
+    return payload, tuple(payload[f] for f in PROFILE_VERSION_FIELDS)
+
+def follow_page(request, follows, side, view):
+    """
+    One keyset page of a follow list, newest first: the `side` user of each
+    Follow as a flat lean row, plus whether the viewer follows them.
+    """
+    lean = LeanUserSerializer(prefix=f'{side}__')
+    paginator = KeysetPagination(('-created_at', '-id'))
+    rows = paginator.paginate_queryset(
+        follows.filter(**{f'{side}__is_active': True}).values('id', 'created_at', *lean.lookups), request, view=view,
+    )
+    followed = graph.followed_among(request.user.pk, [lean.value(row, 'id') for row in rows])
+    return paginator.get_paginated_response([
+        {**lean.to_representation(row), 'followed_at': format_datetime(row['created_at']),
+         'is_following': lean.value(row, 'id') in followed}
+        for row in rows
+    ])
 
 class RegisterAPIView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -20,48 +82,87 @@ class RegisterAPIView(APIView):
             user = serializer.save()
             # Optional: Auto-issue tokens on register
             refresh = RefreshToken.for_user(user)
-            access = refresh.access_token
             user_data = UserSerializer(user).data
             user_data.update({
                 'refresh': str(refresh),
-                'access': str(access),
+                'access': str(refresh.access_token),
             })
             return Response(user_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class LoginAPIView(APIView):
-    permission_classes = [permissions.AllowAny]
+def _api_response(data, status_code, headers=None):
+    # DRF Response outside an APIView: choose the renderer ourselves; Django renders it
+    response = Response(data, status=status_code, headers=headers)
+    response.accepted_renderer = ORJSONRenderer()
+    response.accepted_media_type = ORJSONRenderer.media_type
+    response.renderer_context = {}
+    return response
 
-    def post(self, request):
-        email = request.data.get('email')
-        password = request.data.get('password')
-        if not email or not password:
-            return Response({'error': 'Email and password required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        user = authenticate(request, email=email, password=password)
-        if user:
-            if not user.is_active:
-                return Response({'error': 'Account is inactive'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Use your custom serializer for token response
-            serializer = CustomTokenObtainPairSerializer()
-            token_data = {
-                'refresh': str(RefreshToken.for_user(user)),
-                'access': str(RefreshToken.for_user(user).access_token),
-            }
-            # Merge with custom fields
-            token_data.update({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_image': user.profile_image,
-                'is_verified': user.is_verified,
-                'role': user.role,
-            })
-            return Response(token_data, status=status.HTTP_200_OK)
-        
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+def _too_many_attempts(retry_after):
+    return _api_response({'error': 'Too many login attempts'}, status.HTTP_429_TOO_MANY_REQUESTS,
+                         headers={'Retry-After': str(retry_after)})
+
+def _login_payload(user):
+    # One pair: the access token is derived from the refresh token (one OutstandingToken row)
+    refresh = RefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'bio': user.bio,
+        'profile_image': user.profile_image,
+        'is_verified': user.is_verified,
+        'role': user.role,
+    }
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    POST {'email', 'password'}: a token pair plus the user's profile fields.
+
+    Async so a login waiting on its password hash holds no worker: hashing runs
+    on the bounded pool in users.hashing and is refused (503) when that is
+    saturated. Attempts are throttled per client IP, and failed ones per email
+    and per email and IP, with token buckets (users.throttling, 429 with
+    Retry-After).
+    """
+    async def post(self, request):
+        try:
+            data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+        except ValueError:
+            return _api_response({'error': 'Invalid JSON'}, status.HTTP_400_BAD_REQUEST)
+        email = data.get('email') if isinstance(data, (dict, QueryDict)) else None
+        password = data.get('password') if isinstance(data, (dict, QueryDict)) else None
+        if not isinstance(email, str) or not isinstance(password, str) or not email or not password:
+            return _api_response({'error': 'Email and password required'}, status.HTTP_400_BAD_REQUEST)
+
+        buckets = login_buckets()
+        ip, account = client_ip(request), email.strip().lower()
+        if 'ip' in buckets and (retry_after := await buckets['ip'].aconsume(ip)):
+            return _too_many_attempts(retry_after)
+        failure_buckets = [
+            (buckets[scope], ident) for scope, ident in (('email_ip', f'{account}|{ip}'), ('email', account))
+            if scope in buckets
+        ]
+        # Spent failure budgets refuse the attempt before hashing, whatever the password
+        for bucket, ident in failure_buckets:
+            if retry_after := await bucket.acheck(ident):
+                return _too_many_attempts(retry_after)
+
+        try:
+            user = await aauthenticate(request, email=email, password=password)
+        except HashingPoolFull:
+            return _api_response({'error': 'Login is busy, try again shortly'}, status.HTTP_503_SERVICE_UNAVAILABLE,
+                                 headers={'Retry-After': '1'})
+        if user is None:
+            for bucket, ident in failure_buckets:
+                await bucket.aconsume(ident)
+            return _api_response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+        if not user.is_active:
+            return _api_response({'error': 'Account is inactive'}, status.HTTP_400_BAD_REQUEST)
+        return _api_response(await sync_to_async(_login_payload)(user), status.HTTP_200_OK)
 
 class LogoutAPIView(TokenBlacklistView):
     """
@@ -69,6 +170,8 @@ class LogoutAPIView(TokenBlacklistView):
     Expects: {'refresh': 'your_refresh_token_string'} in request body.
     This invalidates the refresh token server-side; client should discard access token too.
     """
+    # TokenViewBase disables authentication, which made IsAuthenticated reject every logout
+    authentication_classes = APIView.authentication_classes
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
@@ -78,7 +181,7 @@ class LogoutAPIView(TokenBlacklistView):
         
         # Let SimpleJWT handle the blacklisting
         response = super().post(request)
-        if response.status_code == status.HTTP_204_NO_CONTENT:
+        if status.is_success(response.status_code):
             return Response({'message': 'Logged out successfully - token blacklisted'}, status=status.HTTP_205_RESET_CONTENT)
         return response
 
@@ -87,17 +190,14 @@ class ProfileAPIView(APIView):
 
     def get(self, request):
         # Current user's profile
-        serializer = UserSerializer(request.user)
-        data = serializer.data
-        data.update({
-            'followers_count': request.user.followers.count(),
-            'following_count': request.user.following.count(),
-        })
-        return Response(data)
+        # Re-read on a miss: counters move under the request's user instance
+        payload, _ = _cached_profile(User.objects.all(), request.user.pk)
+        return Response(payload)
 
     def put(self, request):
         # Update current user's profile (partial allowed)
-        serializer = UserSerializer(request.user, data=request.data, partial=True)
+        # request.user is built from token claims (users.authentication); save a full row
+        serializer = UserSerializer(User.objects.get(pk=request.user.pk), data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -107,15 +207,13 @@ class UserDetailAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]  # Change to AllowAny for public profiles
 
     def get(self, request, pk):
-        user = get_object_or_404(User.objects.filter(is_active=True), pk=pk)
-        serializer = UserSerializer(user)
-        data = serializer.data
-        data.update({
-            'followers_count': user.followers.count(),
-            'following_count': user.following.count(),
-            'is_following': Follow.objects.filter(follower=request.user, following=user).exists(),
-        })
-        return Response(data)
+        # One query for the profile's version; is_following comes from the graph cache
+        payload, version = _cached_profile(User.objects.filter(is_active=True), pk)
+        is_following = graph.is_following(request.user.pk, pk)
+        # From the payload served, so a client never keeps an old body under a new ETag
+        etag = make_etag(pk, *version, is_following)
+        # is_following is per viewer, so never part of the cached payload
+        return conditional_response(request, etag, lambda: Response({**payload, 'is_following': is_following}))
 
 class FollowAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -125,7 +223,8 @@ class FollowAPIView(APIView):
         if request.user == user_to_follow:
             return Response({'error': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
         
-        follow, created = Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
+        with transaction.atomic():  # Follow row + both users' counters
+            follow, created = Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
         if not created:
             return Response({'error': 'Already following'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -138,6 +237,74 @@ class FollowAPIView(APIView):
 
     def delete(self, request, pk):
         user_to_unfollow = get_object_or_404(User.objects.filter(is_active=True), pk=pk)
-        follow = get_object_or_404(Follow, follower=request.user, following=user_to_unfollow)
-        follow.delete()
-        return Response({'message': f'Unfollowed {user_to_unfollow.username}'}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        with transaction.atomic():
+            # Row-locked: of concurrent unfollows only the one that still finds the row deletes it,
+            # so the post_delete receivers (counters, friendship) run once
+            follow = get_object_or_404(Follow.objects.select_for_update(), follower=request.user, following=user_to_unfollow)
+            follow.delete()
+        return Response({'message': f'Unfollowed {user_to_unfollow.username}'}, status=status.HTTP_204_NO_CONTENT)
+
+class FollowersAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        get_object_or_404(User.objects.filter(is_active=True).only('id'), pk=pk)
+        return follow_page(request, Follow.objects.filter(following_id=pk), 'follower', self)
+
+class FollowingAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        get_object_or_404(User.objects.filter(is_active=True).only('id'), pk=pk)
+        return follow_page(request, Follow.objects.filter(follower_id=pk), 'following', self)
+
+class BulkFollowAPIView(APIView):
+    parser_classes = [JSONParser]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        # {"users": [1, 2, 3]}; ids already followed are reported, not errors
+        serializer = BulkFollowSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_ids = list(dict.fromkeys(serializer.validated_data['users']))
+        if len(user_ids) > BULK_FOLLOW_MAX_USERS:
+            return Response({'error': f'At most {BULK_FOLLOW_MAX_USERS} users per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        followed, already = bulk_follow(request.user, user_ids)
+        return Response({
+            'followed': followed,
+            'already_following': already,
+            'missing': [pk for pk in user_ids if pk not in followed and pk not in already],
+        }, status=status.HTTP_201_CREATED if followed else status.HTTP_200_OK)
+
+class CloseCircleAPIView(APIView):
+    """
+    GET: members of the current user's close circle.
+    POST {'user': id}: add a member; they'll see the user's close-circle posts.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        members = User.objects.filter(close_circle_of__owner=request.user).order_by('username')
+        return Response(UserSerializer(members, many=True).data)
+
+    def post(self, request):
+        user_id = str(request.data.get('user', ''))
+        if not user_id.isdigit():
+            return Response({'error': 'User ID required'}, status=status.HTTP_400_BAD_REQUEST)
+        member = get_object_or_404(User.objects.filter(is_active=True), pk=user_id)
+        if member == request.user:
+            return Response({'error': 'Cannot add yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():  # membership + Audience row
+            _, created = CloseCircleMember.objects.get_or_create(owner=request.user, member=member)
+        return Response(UserSerializer(member).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class CloseCircleMemberAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request, pk):
+        membership = get_object_or_404(CloseCircleMember, owner=request.user, member_id=pk)
+        with transaction.atomic():
+            membership.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)